@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import main as analytics
+import synthetic
+
+# Stages of the analysis of one league, in the order they run
+STAGES = ['players', 'rosters', 'matchups', 'optimal_lineups', 'opponents', 'totals', 'simulation', 'all_play',
+          'analytics', 'leaderboards', 'suggestions']
+
+# Weeks left unscored in the latest season of each league, they are simulated for the playoff odds
+UNSCORED_WEEKS = 4
+
+# A stage only counts as a regression when it is this much slower than the baseline, in seconds, to ignore noise
+REGRESSION_FLOOR = 0.005
+
+
+def write_fixtures(responses, fixture_dir):
+    for path, response in responses.items():
+        fixture_file = analytics.get_fixture_file(fixture_dir, path)
+        os.makedirs(os.path.dirname(fixture_file), exist_ok=True)
+        with open(fixture_file, 'w') as f:
+            json.dump(response, f)
+
+
+def run_stages(league_ids, measure):
+    # Runs every stage of the analysis over all leagues, measure(stage, func) runs and records one stage
+    player_index = measure('players', lambda: analytics.build_player_index(analytics.get_player_data()))
+
+    for league_id in league_ids:
+        league_info = analytics.get_league_info(league_id)
+
+        roster_data = measure('rosters', lambda: analytics.get_roster_data(league_id))
+        matchups, player_points = measure('matchups', lambda: analytics.get_matchup_data(league_id))
+        optimal_lineups = measure('optimal_lineups', lambda: analytics.compute_optimal_lineups(
+            matchups, player_points, player_index, league_info.get('roster_positions')))
+        opponent_index = measure('opponents', lambda: analytics.build_opponent_index(optimal_lineups))
+        team_weeks = measure('totals', lambda: analytics.get_team_weeks(league_info, optimal_lineups, opponent_index))
+        playoff_odds = measure('simulation', lambda: analytics.simulate_playoff_odds(league_info, roster_data,
+                                                                                      optimal_lineups, opponent_index))
+        all_play, head_to_head = measure('all_play', lambda: analytics.calculate_all_play(
+            team_weeks, roster_data['roster_id'].to_numpy()))
+        measure('analytics', lambda: analytics.calculate_analytics(roster_data, team_weeks, playoff_odds, all_play))
+        measure('leaderboards', lambda: analytics.calculate_leaderboards(league_info, roster_data, optimal_lineups,
+                                                                         opponent_index))
+        measure('suggestions', lambda: analytics.calculate_suggestions(roster_data, analytics.PlayerWeekIndex(
+            player_points, player_index, league_info.get('roster_positions'),
+            analytics.get_last_scored_week(league_info))))
+
+
+def benchmark(league_ids, table_dir, repeat):
+    # Best wall time of each stage over `repeat` runs, then one more run under tracemalloc for the peak memory
+    seconds = {stage: float('inf') for stage in STAGES}
+
+    for _ in range(repeat):
+        shutil.rmtree(table_dir, ignore_errors=True)
+        run_seconds = dict.fromkeys(STAGES, 0.0)
+
+        def measure(stage, func):
+            start = time.perf_counter()
+            result = func()
+            run_seconds[stage] += time.perf_counter() - start
+            return result
+
+        run_stages(league_ids, measure)
+        seconds = {stage: min(seconds[stage], run_seconds[stage]) for stage in STAGES}
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    peak_bytes = dict.fromkeys(STAGES, 0)
+
+    def measure_memory(stage, func):
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        result = func()
+        peak_bytes[stage] = max(peak_bytes[stage], tracemalloc.get_traced_memory()[1] - start_bytes)
+        return result
+
+    tracemalloc.start()
+    try:
+        run_stages(league_ids, measure_memory)
+    finally:
+        tracemalloc.stop()
+
+    return seconds, peak_bytes
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    # Stages that got slower than the baseline by more than the tolerance
+    regressions = []
+    for stage, result in results['stages'].items():
+        baseline_seconds = baseline['stages'].get(stage, {}).get('seconds')
+        if baseline_seconds is None:
+            continue
+        if result['seconds'] > baseline_seconds * (1 + tolerance) and \
+                result['seconds'] - baseline_seconds > REGRESSION_FLOOR:
+            regressions.append((stage, baseline_seconds, result['seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the analysis on synthetic Sleeper leagues")
+    parser.add_argument('--leagues', type=int, default=4, help='Number of synthetic leagues')
+    parser.add_argument('--seasons', type=int, default=1, help='Seasons of each synthetic league')
+    parser.add_argument('--teams', type=int, default=12, help='Teams in each league')
+    parser.add_argument('--weeks', type=int, default=17, help='Regular season weeks in each league')
+    parser.add_argument('--roster-size', type=int, default=25, help='Players on each roster')
+    parser.add_argument('--players', type=int, default=10000, help='Size of the player universe')
+    parser.add_argument('--scored-weeks', type=int,
+                        help=f'Weeks already scored in the latest season of each league, the rest are simulated '
+                             f'(all but the last {UNSCORED_WEEKS} by default)')
+    parser.add_argument('--simulations', type=int, default=analytics.SIMULATIONS,
+                        help='Number of simulated seasons behind the playoff odds')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic leagues')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest one is reported')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Save the results as a baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare the results against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline before a stage counts as a regression')
+    args = parser.parse_args()
+    if args.scored_weeks is None:
+        args.scored_weeks = max(args.weeks - UNSCORED_WEEKS, 1)
+    analytics.SIMULATIONS = args.simulations
+
+    league_ids, responses = synthetic.generate_leagues(args.leagues, seasons=args.seasons, teams=args.teams,
+                                                       weeks=args.weeks, roster_size=args.roster_size,
+                                                       players=args.players, scored_weeks=args.scored_weeks,
+                                                       seed=args.seed)
+
+    work_dir = tempfile.mkdtemp(prefix='sleeper_benchmark_')
+    try:
+        # Everything is read from fixtures, so no time goes to the network or to a warm cache
+        fixture_dir = os.path.join(work_dir, 'fixtures')
+        write_fixtures(responses, fixture_dir)
+        analytics.REPLAY_DIR = fixture_dir
+        analytics.set_store_dir(work_dir)
+
+        seconds, peak_bytes = benchmark(league_ids, analytics.TABLE_DIR, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Items each stage works through, to report throughput
+    roster_weeks = len(league_ids) * args.teams * args.weeks
+    items = {stage: roster_weeks for stage in STAGES}
+    items['players'] = args.players
+    items['rosters'] = len(league_ids) * args.teams
+    items['simulation'] = len(league_ids) * args.simulations
+
+    results = {
+        'config': vars(args) | {'league_ids': len(league_ids)},
+        'stages': {stage: {
+            'seconds': seconds[stage],
+            'items_per_second': items[stage] / seconds[stage] if seconds[stage] > 0 else None,
+            'peak_bytes': peak_bytes[stage],
+        } for stage in STAGES},
+    }
+
+    print(f"{len(league_ids)} leagues, {args.teams} teams, {args.weeks} weeks, {args.roster_size} players per roster, "
+          f"{args.players} players")
+    print(f"{'stage':<16}{'seconds':>10}{'items/s':>14}{'peak MiB':>10}")
+    for stage, result in results['stages'].items():
+        items_per_second = result['items_per_second'] or 0
+        print(f"{stage:<16}{result['seconds']:>10.4f}{items_per_second:>14.0f}"
+              f"{result['peak_bytes'] / 1024 / 1024:>10.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for stage, baseline_seconds, stage_seconds in regressions:
+            print(f"Regression in {stage}: {baseline_seconds:.4f}s -> {stage_seconds:.4f}s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,578 +1,2157 @@
+import contextlib
+import cProfile
+import functools
+import hashlib
+import heapq
+import itertools
+import json
 import os
+import pickle
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
-import requests
-import matplotlib.pyplot as plt
 import argparse
 
-parser = argparse.ArgumentParser(description="Analyze and visualize data from multiple Sleeper fantasy football leagues")
-parser.add_argument('league_ids', nargs='+', type=str, help='List of league ids to analyze (e.g., 12345 67890)')
-LEAGUE_IDS = parser.parse_args().league_ids
-
-global LEAGUE_ID
-LEAGUE_ID = LEAGUE_IDS[0]
-
-global matchup_data, player_data, roster_data
-matchup_data = pd.DataFrame()
-player_data = pd.DataFrame()
-roster_data = pd.DataFrame()
-
-
-def get_player_data():
-    player_data_file = f'player_data_{LEAGUE_ID}.csv'  # Append league_id to the file name
-
-    # try and load from local file
-    if os.path.exists(player_data_file):
-        player_data = pd.read_csv(player_data_file)
-        return player_data
-
-    # Make a request to https://api.sleeper.app/v1/players/nfl
-    req = requests.get('https://api.sleeper.app/v1/players/nfl')
-    player_data = pd.DataFrame(req.json())
-    player_data = player_data.T
-    player_data = player_data.reset_index()
-    player_data.to_csv(player_data_file, index=False)
-    return player_data
-
-
-
-def get_roster_data():
-    roster_data_file = f'roster_data_{LEAGUE_ID}.csv'  # Append league_id to the file name
-
-    # Make a request to https://api.sleeper.app/v1/league/<league_id>/rosters
-    req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}/rosters')
-    roster_data = pd.DataFrame(req.json())
-
-    # For each roster, get the name of the owner
-    for index, row in roster_data.iterrows():
-        req = requests.get(f'https://api.sleeper.app/v1/user/{row["owner_id"]}')
-        roster_data.loc[index, 'owner_id'] = req.json()['display_name']
-
-    roster_data.to_csv(roster_data_file, index=False)
-    return roster_data
-
-
-def get_matchup_data():
-    matchup_data_file = f'matchup_data_{LEAGUE_ID}.csv'  # Append league_id to the file name
-
-    # Get the league metadata to determine how many weeks the season has
-    req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}')
-    league_info = req.json()
-
-    # Determine the total number of weeks in the season
-    total_weeks = league_info.get('settings', {}).get('playoff_week_start', 17) - 1
-
-    # Initialize an empty DataFrame for matchup data
-    matchup_data = pd.DataFrame()
-
-    # Iterate through all weeks of the season
-    for week in range(1, total_weeks + 1):
-        req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}/matchups/{week}')
-        week_data = pd.DataFrame(req.json())
-        week_data['week'] = week
-        matchup_data = pd.concat([matchup_data, week_data])
-
-    # Save the data to a CSV file
-    matchup_data.to_csv(matchup_data_file, index=False)
-
-    return matchup_data
-
-
-
-def get_total_points_for():
-    id_to_pf = {}
-
-    for index, manager in roster_data.iterrows():
-        matchup_data_temp = matchup_data.copy()
-        matchup_data_temp = matchup_data_temp[matchup_data_temp['roster_id'] == manager['roster_id']]
-        id_to_pf[manager['roster_id']] = matchup_data_temp['points'].sum()
-
-    return id_to_pf
-
-
-def get_total_points_against():
-    id_to_pa = {}
-
-    for index, manager in roster_data.iterrows():
-        matchup_data_temp = matchup_data.copy()
-
-        # Filter out the matchups entries with the manager's team
-        matchup_data_temp = matchup_data_temp[matchup_data_temp['roster_id'] != manager['roster_id']]
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is left out of the --profile report there
+    resource = None
+
+# Columns of a matchup row, a season without any weeks left to fetch still has them
+MATCHUP_COLUMNS = ['roster_id', 'matchup_id', 'points', 'players', 'players_points', 'starters', 'week']
+
+# The only player fields the analytics read
+PLAYER_COLUMNS = ['player_id', 'full_name', 'position']
+
+# Positions each starting slot accepts, bench, taxi and reserve slots are not listed because they never score
+SLOT_POSITIONS = {
+    'QB': ['QB'],
+    'RB': ['RB'],
+    'WR': ['WR'],
+    'TE': ['TE'],
+    'K': ['K'],
+    'DEF': ['DEF'],
+    'DL': ['DL'],
+    'LB': ['LB'],
+    'DB': ['DB'],
+    'FLEX': ['RB', 'WR', 'TE'],
+    'WRRB_FLEX': ['RB', 'WR'],
+    'REC_FLEX': ['WR', 'TE'],
+    'SUPER_FLEX': ['QB', 'RB', 'WR', 'TE'],
+    'IDP_FLEX': ['DL', 'LB', 'DB'],
+}
+
+# Used when a league does not report its roster_positions: 1 QB, 2 RB, 2 WR, 1 TE, 1 FLEX, 1 SUPERFLEX, 1 K, 1 DEF
+DEFAULT_ROSTER_POSITIONS = ['QB', 'RB', 'RB', 'WR', 'WR', 'TE', 'FLEX', 'SUPER_FLEX', 'K', 'DEF']
+
+# Memory for the scores of the lineup splits of a chunk of roster-weeks, bounds the memory used by
+# compute_optimal_lineups() however many splits the starting slots allow
+LINEUP_CHUNK_BYTES = 64 * 2 ** 20
+
+# Seasons simulated for the playoff odds, in chunks that bound the memory used by simulate_playoff_odds(). The fixed
+# seed keeps the odds of a league the same from run to run.
+SIMULATIONS = 100000
+SIMULATION_CHUNK_SIZE = 10000
+SIMULATION_SEED = 0
+DEFAULT_PLAYOFF_TEAMS = 6
+
+# Scores of final weeks are kept here between runs, with --incremental only newer weeks are fetched and scored
+SCORE_STORE_DIR = '.sleeper_store'
+INCREMENTAL = False
+
+# Typed columnar tables of players, rosters and matchups: one memory-mapped .npy file per column. Strings are
+# dictionary encoded as 'category', lists and dicts are exploded into flat tables of their own.
+TABLE_DIR = os.path.join(SCORE_STORE_DIR, 'tables')
+# Seconds a replaced version of a table is kept for the processes still reading it
+TABLE_VERSION_TTL = 10 * 60
+PLAYER_SCHEMA = {'player_id': 'category', 'full_name': 'category', 'position': 'category'}
+ROSTER_SCHEMA = {'roster_id': 'int64', 'user_id': 'category', 'record': 'category'}
+ROSTER_PLAYER_SCHEMA = {'roster_id': 'int64', 'player_id': 'category'}
+MATCHUP_SCHEMA = {'week': 'int64', 'roster_id': 'int64', 'matchup_id': 'float64', 'points': 'float64'}
+PLAYER_POINTS_SCHEMA = {'week': 'int64', 'roster_id': 'int64', 'player_id': 'category', 'points': 'float64',
+                        'starter': 'bool'}
+
+# Analysis of each completed season, computed once and kept for good. The version is part of the file name, so changing
+# what an analysis holds means bumping it.
+SEASON_STORE_DIR = os.path.join(SCORE_STORE_DIR, 'seasons')
+SEASON_STORE_VERSION = 8
+
+
+# Weekly points of each team that get distributional statistics. A week is a boom when it beats BOOM_QUANTILE of every
+# team-week of the league and a bust when it falls below BUST_QUANTILE.
+DISTRIBUTION_COLUMNS = ['points_for', 'points_against', 'optimal_points_for']
+BOOM_QUANTILE = 0.75
+BUST_QUANTILE = 0.25
+
+# All-play record of each team against the whole league every week, and its luck against its actual schedule
+ALL_PLAY_COLUMNS = ['all_play_wins', 'all_play_losses', 'all_play_ties', 'all_play_percentage', 'expected_wins', 'luck']
+
+# Statistics shown as percentages, every other float column is rounded to two decimals when printed
+PERCENTAGE_COLUMNS = ['win_percentage', 'efficiency_for', 'efficiency_against', 'playoff_odds', 'all_play_percentage'] + \
+    [f'{column}_{rate}' for column in DISTRIBUTION_COLUMNS for rate in ['consistency', 'boom_rate', 'bust_rate']]
+
+# Weekly leaderboards: name -> (title, column ranked on, largest first)
+TOP_K = 10
+LEADERBOARDS = {
+    'worst_efficiency_weeks': ('Top {k} worst efficiency weeks across all years', 'Efficiency', False),
+    'worst_weeks': ('Top {k} worst weeks across all years', 'Actual PF', False),
+    'best_weeks': ('Top {k} best weeks across all years', 'Actual PF', True),
+    'biggest_blowouts': ('Top {k} biggest blowouts across all years', 'Margin', True),
+    'most_points_missed': ('Top {k} most points missed across all years', 'Points Missed', True),
+}
+
+# Trade and waiver suggestions printed with --suggestions: pickups suggested per team, and the number of free agents
+# scored at once, which bounds the memory used by suggest_pickups()
+SUGGESTIONS = False
+PICKUP_SUGGESTIONS = 3
+PICKUP_BATCH_SIZE = 64
+
+# Moving average of each team's weekly points, plotted per league
+MOVING_AVERAGE_WINDOW = 3
+MOVING_AVERAGE_PLOT = 'rounded_line_moving_average.png'
+
+# Number of worker processes analyzing leagues, and the per-team sums and counts they hand back to be merged
+JOBS = 1
+TEAM_TOTAL_COLUMNS = ['owner_id', 'wins', 'losses', 'points_for', 'points_against', 'optimal_points_for',
+                      'optimal_points_against', 'points_difference', 'all_play_wins', 'all_play_losses',
+                      'all_play_ties', 'expected_wins', 'luck']
+
+SLEEPER_API = 'https://api.sleeper.app/v1'
+
+# Fixtures hold one response per endpoint, e.g. <dir>/league/<league_id>/matchups/1.json
+RECORD_DIR = None
+REPLAY_DIR = None
+
+# Every Sleeper response is cached on disk under CACHE_DIR, keyed by URL
+CACHE_DIR = '.sleeper_cache'
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_FOREVER = float('inf')
+
+# How long (in seconds) a cached response stays fresh, first matching pattern wins
+CACHE_TTLS = [
+    (r'^/players/nfl$', 24 * 60 * 60),
+    (r'^/user/[^/]+$', 24 * 60 * 60),
+    (r'^/league/[^/]+/users$', 24 * 60 * 60),
+    (r'^/league/[^/]+$', 60 * 60),
+    (r'^/league/[^/]+/rosters$', 5 * 60),
+    (r'^/league/[^/]+/matchups/\d+$', 5 * 60),
+]
+CACHE_DEFAULT_TTL = 5 * 60
+
+cache_lock = threading.Lock()
+cache_size = {'bytes': None}
+
+# Sleeper asks clients to stay under 1000 requests per minute
+MAX_CONCURRENCY = 8
+RATE_LIMIT_PER_MINUTE = 900
+
+session_lock = threading.Lock()
+http_session = {'session': None, 'rate_limiter': None}
+
+# --profile report and the optional cProfile and tracemalloc dumps
+PROFILE_FILE = None
+CPROFILE_FILE = None
+TRACEMALLOC_FILE = None
+
+# Counted for every Sleeper response, in total and per endpoint
+HTTP_COUNTERS = ['requests', 'bytes_downloaded', 'cache_hits', 'cache_revalidations', 'cache_misses', 'cache_bytes',
+                 'fixture_reads', 'fixture_bytes']
+
+
+class RateLimiter:
+    # Token bucket: allows short bursts of up to `burst` requests while keeping the average under the limit
+    def __init__(self, calls_per_minute, burst):
+        self.rate = calls_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def merge_counts(target, source):
+    # Add the numbers of a nested dict of counters into another one
+    for name, value in source.items():
+        if isinstance(value, dict):
+            merge_counts(target.setdefault(name, {}), value)
+        else:
+            target[name] = target.get(name, 0) + value
+
+
+def get_endpoint(path):
+    # /league/123/matchups/4 -> /league/{id}/matchups/{id}, so requests are counted per kind of endpoint
+    return re.sub(r'/[^/]*\d[^/]*', '/{id}', path)
+
+
+class Profiler:
+    # Wall and CPU time per stage of the run plus HTTP and cache counters, shared by every thread
+    def __init__(self):
+        self.stages = {}
+        self.http = dict.fromkeys(HTTP_COUNTERS, 0)
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            stage = {'wall_seconds': time.perf_counter() - wall_start,
+                     'cpu_seconds': time.process_time() - cpu_start, 'calls': 1}
+            with self.lock:
+                merge_counts(self.stages.setdefault(name, {}), stage)
+
+    def count(self, path, name, value=1):
+        with self.lock:
+            self.http[name] += value
+            endpoint = self.endpoints.setdefault(get_endpoint(path), dict.fromkeys(HTTP_COUNTERS, 0))
+            endpoint[name] += value
+
+    def snapshot(self):
+        # Plain dicts, so a worker process can hand its share of the run back to be merged
+        with self.lock:
+            snapshot = {'stages': {}, 'http': {}, 'endpoints': {}}
+            merge_counts(snapshot, {'stages': self.stages, 'http': self.http, 'endpoints': self.endpoints})
+            return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.http = dict.fromkeys(HTTP_COUNTERS, 0)
+            self.endpoints = {}
+
+    def merge(self, snapshot):
+        with self.lock:
+            merge_counts(self.stages, snapshot['stages'])
+            merge_counts(self.http, snapshot['http'])
+            merge_counts(self.endpoints, snapshot['endpoints'])
+
+
+profiler = Profiler()
+
+
+def get_session():
+    # One keep-alive session shared by every thread, with retries and backoff for throttled or failed requests
+    with session_lock:
+        if http_session['session'] is None:
+            # Imported on first use, so replayed runs and worker processes that only read the cache start faster
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=['GET'], respect_retry_after_header=True)
+            adapter = HTTPAdapter(pool_connections=MAX_CONCURRENCY, pool_maxsize=MAX_CONCURRENCY, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            http_session['session'] = session
+            http_session['rate_limiter'] = RateLimiter(RATE_LIMIT_PER_MINUTE, burst=MAX_CONCURRENCY * 4)
+        return http_session['session'], http_session['rate_limiter']
+
+
+def get_cache_ttl(path):
+    for pattern, ttl in CACHE_TTLS:
+        if re.match(pattern, path):
+            return ttl
+    return CACHE_DEFAULT_TTL
+
+
+def get_cache_paths(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, key + '.json'), os.path.join(CACHE_DIR, key + '.meta.json')
+
+
+def write_file_atomically(file_name, content):
+    # Write to a temporary file first so readers never see a partially written file
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(file_name) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(temp_file, file_name)
+
+
+def read_cache_meta(meta_file):
+    try:
+        with open(meta_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_cache_entries():
+    # (path, size, mtime) of every file in the cache. Files another thread or process is still writing (.tmp) are
+    # skipped, and files removed or replaced while scanning are left out.
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith('.tmp'):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((entry.path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def evict_cache(new_bytes):
+    # Drop the least recently used responses once the cache grows past CACHE_MAX_BYTES. new_bytes is how much the cache
+    # grew, so an overwritten response only counts the difference to the body it replaced.
+    with cache_lock:
+        if cache_size['bytes'] is None:
+            cache_size['bytes'] = sum(size for _, size, _ in get_cache_entries())
+        else:
+            cache_size['bytes'] += new_bytes
+
+        if cache_size['bytes'] <= CACHE_MAX_BYTES:
+            return
+
+        # Reading a response touches its body file, so the oldest mtime is the least recently used
+        files = get_cache_entries()
+        cache_size['bytes'] = sum(size for _, size, _ in files)
+        bodies = sorted((mtime, path) for path, _, mtime in files
+                        if path.endswith('.json') and not path.endswith('.meta.json'))
+
+        for _, body_file in bodies:
+            if cache_size['bytes'] <= CACHE_MAX_BYTES:
+                break
+            for file_name in (body_file, body_file[:-len('.json')] + '.meta.json'):
+                try:
+                    cache_size['bytes'] -= os.stat(file_name).st_size
+                    os.remove(file_name)
+                except FileNotFoundError:
+                    pass
+
+
+def fetch_cached(path, ttl=None):
+    url = SLEEPER_API + path
+    if ttl is None:
+        ttl = get_cache_ttl(path)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    body_file, meta_file = get_cache_paths(url)
+    meta = read_cache_meta(meta_file)
+    headers = {}
+
+    if meta is not None and os.path.exists(body_file):
+        # Serve straight from disk while the response is still fresh, immutable responses are fresh forever. A response
+        # cached before its week was final is revalidated once, CACHE_FOREVER only covers responses fetched as final.
+        fresh = meta.get('final') if ttl == CACHE_FOREVER else time.time() - meta['fetched_at'] < ttl
+        if meta.get('immutable') or fresh:
+            os.utime(body_file)
+            with open(body_file, 'rb') as f:
+                content = f.read()
+            profiler.count(path, 'cache_hits')
+            profiler.count(path, 'cache_bytes', len(content))
+            return content
+
+        # Otherwise revalidate, so an unchanged response costs a 304 instead of the full payload
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    session, rate_limiter = get_session()
+    rate_limiter.acquire()
+    req = session.get(url, headers=headers, timeout=60)
+    profiler.count(path, 'requests')
+
+    if req.status_code == 304 and headers:
+        meta['fetched_at'] = time.time()
+        meta['final'] = ttl == CACHE_FOREVER
+        write_file_atomically(meta_file, json.dumps(meta).encode('utf-8'))
+        os.utime(body_file)
+        with open(body_file, 'rb') as f:
+            content = f.read()
+        profiler.count(path, 'cache_revalidations')
+        profiler.count(path, 'cache_bytes', len(content))
+        return content
+
+    req.raise_for_status()
+    profiler.count(path, 'cache_misses')
+    profiler.count(path, 'bytes_downloaded', len(req.content))
+
+    try:
+        old_bytes = os.stat(body_file).st_size
+    except FileNotFoundError:
+        old_bytes = 0
+    write_file_atomically(body_file, req.content)
+    write_file_atomically(meta_file, json.dumps({
+        'url': url,
+        'fetched_at': time.time(),
+        'etag': req.headers.get('ETag'),
+        'last_modified': req.headers.get('Last-Modified'),
+        'final': ttl == CACHE_FOREVER,
+    }).encode('utf-8'))
+    evict_cache(len(req.content) - old_bytes)
+
+    return req.content
+
+
+def mark_immutable(path):
+    # The cached response of path can never change again, so it is never revalidated
+    if REPLAY_DIR is not None:
+        return
+    body_file, meta_file = get_cache_paths(SLEEPER_API + path)
+    meta = read_cache_meta(meta_file)
+    if meta is not None and not meta.get('immutable'):
+        meta['immutable'] = True
+        write_file_atomically(meta_file, json.dumps(meta).encode('utf-8'))
 
-        # Filter out the matchup entries where matchup id is not unique for the week
-        matchup_data_temp = matchup_data_temp.drop_duplicates(subset=['week', 'matchup_id'], keep=False)
 
-        # Add up the points column to get the total points against
-        id_to_pa[manager['roster_id']] = matchup_data_temp['points'].sum()
+def get_fixture_file(fixture_dir, path):
+    return os.path.join(fixture_dir, *path.strip('/').split('/')) + '.json'
 
-    return id_to_pa
 
+def sleeper_get(path, ttl=None, object_pairs_hook=None):
+    # Replayed runs read every response from the fixtures and never touch the network or the cache
+    if REPLAY_DIR is not None:
+        with open(get_fixture_file(REPLAY_DIR, path), 'rb') as f:
+            content = f.read()
+        profiler.count(path, 'fixture_reads')
+        profiler.count(path, 'fixture_bytes', len(content))
+        return json.loads(content, object_pairs_hook=object_pairs_hook)
 
-def get_optimal_roster_from_matchup(matchup_data_temp):
-    # Lineups are superflex: 1 QB, 2 RB, 2 WR, 1 TE, 1 FLEX, 1 SUPERFLEX, 1 DEF, 1 K
+    content = fetch_cached(path, ttl)
 
-    # Use the list of player ids to get the player data
-    roster_for_week = pd.DataFrame()
-    for index, matchup in matchup_data_temp.iterrows():
-        for idx, player_id in enumerate(matchup['players']):
-            player = player_data[player_data['player_id'] == player_id]
-            roster_for_week.loc[idx, 'player_name'] = player['full_name'].values[0]
-            roster_for_week.loc[idx, 'position'] = player['position'].values[0]
-            roster_for_week.loc[idx, 'points'] = matchup['players_points'].get(player_id, 0)
+    if RECORD_DIR is not None:
+        fixture_file = get_fixture_file(RECORD_DIR, path)
+        os.makedirs(os.path.dirname(fixture_file), exist_ok=True)
+        write_file_atomically(fixture_file, content)
 
-    # Sort the roster by points
-    roster_for_week = roster_for_week.sort_values(by=['points'], ascending=False)
+    return json.loads(content, object_pairs_hook=object_pairs_hook)
 
-    # Get the mandatory positions: 1 QB, 2 RB, 2 WR, 1 TE, 1 DEF, 1 K
-    optimal_roster = pd.DataFrame()
 
-    # qb
-    optimal_roster = pd.concat([optimal_roster, roster_for_week[roster_for_week['position'] == 'QB'].head(1)])
-    roster_for_week.drop(roster_for_week[roster_for_week['position'] == 'QB'].head(1).index, inplace=True)
+def sleeper_get_all(paths, ttls=None):
+    # Fetch many endpoints concurrently, results come back in the same order as the paths
+    if ttls is None:
+        ttls = [None] * len(paths)
 
-    # rb
-    optimal_roster = pd.concat([optimal_roster, roster_for_week[roster_for_week['position'] == 'RB'].head(2)])
-    roster_for_week.drop(roster_for_week[roster_for_week['position'] == 'RB'].head(2).index, inplace=True)
+    if len(paths) <= 1:
+        return [sleeper_get(path, ttl=ttl) for path, ttl in zip(paths, ttls)]
 
-    # wr
-    optimal_roster = pd.concat([optimal_roster, roster_for_week[roster_for_week['position'] == 'WR'].head(2)])
-    roster_for_week.drop(roster_for_week[roster_for_week['position'] == 'WR'].head(2).index, inplace=True)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+        return list(executor.map(lambda item: sleeper_get(item[0], ttl=item[1]), zip(paths, ttls)))
+
+
+def get_league_info(league_id):
+    league_info = sleeper_get(f'/league/{league_id}')
+
+    # A completed season never changes again
+    if league_info is not None and league_info.get('status') == 'complete':
+        mark_immutable(f'/league/{league_id}')
+    return league_info
+
+
+def get_league_season(league_id):
+    # The season of a league as a number, 0 when it is unknown
+    season = (get_league_info(league_id) or {}).get('season')
+    return int(season) if season and str(season).isdigit() else 0
+
+
+def get_league_history(league_ids):
+    # Every league id followed by its earlier seasons through previous_league_id, newest first. The chains of all
+    # leagues are followed together, one season further back per round of concurrent requests.
+    previous_league_ids = {}
+    seen = set(league_ids)
+    earlier_seasons = list(dict.fromkeys(league_ids))
+
+    while earlier_seasons:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+            league_infos = list(executor.map(get_league_info, earlier_seasons))
+
+        next_seasons = []
+        for league_id, league_info in zip(earlier_seasons, league_infos):
+            previous_league_id = (league_info or {}).get('previous_league_id')
+            if not previous_league_id or previous_league_id == '0':
+                continue
+            previous_league_ids[league_id] = previous_league_id
+            if previous_league_id not in seen:
+                seen.add(previous_league_id)
+                next_seasons.append(previous_league_id)
+        earlier_seasons = next_seasons
+
+    # Leagues sharing their history list the shared seasons once
+    history = []
+    for league_id in dict.fromkeys(league_ids):
+        while league_id is not None and league_id not in history:
+            history.append(league_id)
+            league_id = previous_league_ids.get(league_id)
+    return history
+
+
+def is_week_final(league_info, week):
+    # Weeks of a completed season, and weeks before the last scored one, will never change again
+    if league_info.get('status') == 'complete':
+        return True
+    return week < league_info.get('settings', {}).get('last_scored_leg', 0)
+
+
+def get_matchup_ttls(league_info, weeks):
+    return [CACHE_FOREVER if is_week_final(league_info, week) else None for week in weeks]
+
+
+def get_first_week_to_fetch(league_id, league_info, incremental=False):
+    # With --incremental, weeks up to the last finalized one are read back from the score store instead
+    if not incremental:
+        return 1
+    config = get_lineup_config_hash(league_info.get('roster_positions'))
+    return score_store.load_state(league_id, config)['last_final_week'] + 1
+
+
+def prefetch_leagues(league_ids, incremental=False):
+    # Warm the cache for every league at once, so the per-league analysis below only reads from disk
+    league_infos = sleeper_get_all([f'/league/{league_id}' for league_id in league_ids])
+
+    paths = ['/players/nfl']
+    ttls = [None]
+    for league_id, league_info in zip(league_ids, league_infos):
+        total_weeks = league_info.get('settings', {}).get('playoff_week_start', 17) - 1
+        weeks = range(get_first_week_to_fetch(league_id, league_info, incremental), total_weeks + 1)
+        paths += [f'/league/{league_id}/rosters', f'/league/{league_id}/users'] + \
+            [f'/league/{league_id}/matchups/{week}' for week in weeks]
+        ttls += [None, None] + get_matchup_ttls(league_info, weeks)
+
+    sleeper_get_all(paths, ttls)
+
+
+class UserDirectory:
+    # user_id -> display name of every league member seen so far, shared by all leagues in the process. The members of
+    # a league come from a single /league/<league_id>/users request, reloaded once the cached response expires so a
+    # long-running process picks up renames. Statistics are kept by user_id, so renamed users stay one owner and users
+    # with the same display name stay apart, and names are only looked up for output.
+    def __init__(self):
+        self.names = {}
+        self.seasons = {}
+        self.loaded_at = {}
+        self.lock = threading.Lock()
+
+    def load_league(self, league_id, user_ids=()):
+        season = None
+        with self.lock:
+            loaded_at = self.loaded_at.get(league_id)
+        if loaded_at is None or time.time() - loaded_at >= get_cache_ttl(f'/league/{league_id}/users'):
+            season = get_league_season(league_id)
+            self.update({user['user_id']: user.get('display_name') for user in
+                         sleeper_get(f'/league/{league_id}/users') or []}, season)
+            with self.lock:
+                self.loaded_at[league_id] = time.time()
+
+        # Owners that already left the league are looked up one by one
+        with self.lock:
+            missing = sorted({user_id for user_id in user_ids if user_id and user_id not in self.names})
+        if missing:
+            if season is None:
+                season = get_league_season(league_id)
+            self.update({user['user_id']: user.get('display_name') for user in
+                         sleeper_get_all([f'/user/{user_id}' for user_id in missing]) if user}, season)
+
+    def update(self, names, season=0):
+        # A user's name comes from the newest season it was seen in, so with --history names from older seasons do not
+        # replace current ones. Names from the same season replace each other, so a reloaded league shows renames.
+        with self.lock:
+            for user_id, name in names.items():
+                if name is not None and season >= self.seasons.get(user_id, 0):
+                    self.names[user_id] = name
+                    self.seasons[user_id] = season
+
+    def get_names(self, user_ids):
+        # user_id -> display name, users without a known name keep their user_id
+        with self.lock:
+            return {user_id: self.names.get(user_id) or user_id for user_id in user_ids}
+
+
+user_directory = UserDirectory()
+
+
+def with_display_names(df, column='owner_id'):
+    # Adds the display name of each user_id in column right after it, for output
+    df = df.copy()
+    names = user_directory.get_names(set(df[column]))
+    df.insert(df.columns.get_loc(column) + 1, 'display_name', df[column].map(names))
+    return df
+
+
+def save_table(name, df, schema, meta=None):
+    # Each column is written to its own .npy file so loads can pick columns and memory-map them. meta is saved in
+    # schema.json next to the columns. Every save writes a new version directory and then atomically replaces the
+    # <name>.current file naming it, so other processes always read one complete version.
+    os.makedirs(TABLE_DIR, exist_ok=True)
+    version_dir = tempfile.mkdtemp(dir=TABLE_DIR, prefix=f'{name}.')
+
+    for column, dtype in schema.items():
+        if dtype == 'category':
+            values = pd.Categorical(df[column].astype(object).where(df[column].notna(), None))
+            np.save(os.path.join(version_dir, f'{column}.npy'), values.codes.astype(np.int32))
+            np.save(os.path.join(version_dir, f'{column}.categories.npy'), np.array(values.categories, dtype=str))
+        else:
+            np.save(os.path.join(version_dir, f'{column}.npy'), df[column].to_numpy(dtype=dtype))
+
+    with open(os.path.join(version_dir, 'schema.json'), 'w') as f:
+        json.dump({'columns': schema, 'rows': len(df), 'saved_at': time.time(), **(meta or {})}, f)
+
+    previous = get_table_version(name)
+    fd, temp_path = tempfile.mkstemp(dir=TABLE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(os.path.basename(version_dir))
+    os.replace(temp_path, os.path.join(TABLE_DIR, f'{name}.current'))
+
+    # The replaced version's mtime is when it stopped being current, remove_old_table_versions() goes by it
+    if previous is not None:
+        try:
+            os.utime(os.path.join(TABLE_DIR, previous))
+        except FileNotFoundError:
+            pass
+    remove_old_table_versions(name)
+
+
+def remove_old_table_versions(name):
+    # Versions replaced more than TABLE_VERSION_TTL ago are removed. Newer ones may still be read by a process that
+    # resolved the table before it was replaced, or still be written by one that is about to replace it.
+    current = get_table_version(name)
+    for entry in os.scandir(TABLE_DIR):
+        if not entry.name.startswith(f'{name}.') or entry.name == current or not entry.is_dir():
+            continue
+        try:
+            if time.time() - entry.stat().st_mtime > TABLE_VERSION_TTL:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+def get_table_version(name):
+    # Name of the version directory holding the current version of a table, None before it was first saved
+    try:
+        with open(os.path.join(TABLE_DIR, f'{name}.current')) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def get_league_state(league_info):
+    # Saved with the tables of a league, so tables written during the season are not mistaken for final ones
+    return {'status': league_info.get('status'),
+            'last_scored_leg': league_info.get('settings', {}).get('last_scored_leg')}
+
+
+def is_table_final(name):
+    # Only tables written after the season completed hold the final rosters and matchups
+    schema = read_table_schema(name)
+    return schema is not None and schema.get('status') == 'complete'
+
+
+def read_table_schema(name, version=None):
+    version = version or get_table_version(name)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(TABLE_DIR, version, 'schema.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_table(name, columns=None):
+    # Only the requested columns are read, numeric columns stay memory-mapped. Schema and columns come from the same
+    # version, however often the table is saved meanwhile.
+    version = get_table_version(name)
+    schema = read_table_schema(name, version)
+    if schema is None:
+        return None
+
+    table_dir = os.path.join(TABLE_DIR, version)
+    data = {}
+    for column in columns or list(schema['columns']):
+        values = np.load(os.path.join(table_dir, f'{column}.npy'), mmap_mode='r')
+        if schema['columns'][column] == 'category':
+            categories = np.load(os.path.join(table_dir, f'{column}.categories.npy'))
+            values = pd.Categorical.from_codes(values, categories.astype(object))
+        data[column] = values
+
+    return pd.DataFrame(data, columns=columns or list(schema['columns']))
+
+
+def project_player(pairs):
+    # Decoder hook for the players dump. Each player is cut down to the PLAYER_COLUMNS as soon as it is parsed, so
+    # the ~45 fields of every player are never all held in memory at once.
+    fields = dict(pairs)
+    if 'player_id' in fields:
+        return tuple(fields.get(column) for column in PLAYER_COLUMNS)
+    return fields
 
-    # te
-    optimal_roster = pd.concat([optimal_roster, roster_for_week[roster_for_week['position'] == 'TE'].head(1)])
-    roster_for_week.drop(roster_for_week[roster_for_week['position'] == 'TE'].head(1).index, inplace=True)
 
-    # DEF
-    optimal_roster = pd.concat([optimal_roster, roster_for_week[roster_for_week['position'] == 'DEF'].head(1)])
-    roster_for_week.drop(roster_for_week[roster_for_week['position'] == 'DEF'].head(1).index, inplace=True)
+def get_player_data():
+    # The players dump is the same for every league, so it is parsed once a day into the players table
+    schema = read_table_schema('players')
+    if schema is not None and time.time() - schema['saved_at'] < get_cache_ttl('/players/nfl'):
+        return load_table('players', PLAYER_COLUMNS)
 
-    # k
-    optimal_roster = pd.concat([optimal_roster, roster_for_week[roster_for_week['position'] == 'K'].head(1)])
-    roster_for_week.drop(roster_for_week[roster_for_week['position'] == 'K'].head(1).index, inplace=True)
+    players = sleeper_get('/players/nfl', object_pairs_hook=project_player)
+    player_data = pd.DataFrame([player for player in players.values() if isinstance(player, tuple)],
+                               columns=PLAYER_COLUMNS)
 
-    # Now for FLEX and SUPERFLEX, sort remaining players by points
-    # flex: 1 RB, WR, or TE
-    flex_players = roster_for_week[(roster_for_week['position'] == 'RB') | 
-                                   (roster_for_week['position'] == 'WR') | 
-                                   (roster_for_week['position'] == 'TE')].head(1)
-    optimal_roster = pd.concat([optimal_roster, flex_players])
-    roster_for_week.drop(flex_players.index, inplace=True)
+    save_table('players', player_data, PLAYER_SCHEMA)
+    return player_data
 
-    # superflex: 1 QB, RB, WR, or TE
-    superflex_players = roster_for_week[(roster_for_week['position'] == 'QB') | 
-                                        (roster_for_week['position'] == 'RB') | 
-                                        (roster_for_week['position'] == 'WR') | 
-                                        (roster_for_week['position'] == 'TE')].head(1)
-    optimal_roster = pd.concat([optimal_roster, superflex_players])
 
-    return optimal_roster['points'].sum()
+def build_player_index(player_data):
+    # player_id -> (full_name, position), built once per run instead of scanning player_data for every lookup
+    return dict(zip(player_data['player_id'], zip(player_data['full_name'], player_data['position'])))
 
 
+def lookup_players(player_index, player_ids):
+    # Resolve a whole roster in one call, unknown players come back without a name or position
+    unknown = (None, None)
+    players = [player_index.get(player_id, unknown) for player_id in player_ids]
+    return pd.DataFrame({
+        'player_id': player_ids,
+        'player_name': [player[0] for player in players],
+        'position': [player[1] for player in players],
+    })
 
-def get_optimal_points_for():
-    id_to_opf = {}
 
-    for index, manager in roster_data.iterrows():
-        matchup_data_temp = matchup_data.copy()
-        matchup_data_temp = matchup_data_temp[matchup_data_temp['roster_id'] == manager['roster_id']]
+def save_roster_tables(league_id, roster_data, league_info):
+    rosters = pd.DataFrame({
+        'roster_id': roster_data['roster_id'],
+        'user_id': roster_data['owner_id'],
+        'record': [metadata.get('record') if isinstance(metadata, dict) else None
+                   for metadata in roster_data['metadata']],
+    })
+    player_lists = [players if isinstance(players, list) else [] for players in roster_data['players']]
+    roster_players = pd.DataFrame({
+        'roster_id': np.repeat(roster_data['roster_id'].to_numpy(), [len(players) for players in player_lists]),
+        'player_id': [player_id for players in player_lists for player_id in players],
+    })
 
-        running_total = 0
+    league_state = get_league_state(league_info)
+    save_table(f'rosters_{league_id}', rosters, ROSTER_SCHEMA, league_state)
+    save_table(f'roster_players_{league_id}', roster_players, ROSTER_PLAYER_SCHEMA, league_state)
 
-        for week in range(1, matchup_data_temp['week'].max() + 1):
-            matchup_data_temp_week = matchup_data_temp[matchup_data_temp['week'] == week]
-            running_total += get_optimal_roster_from_matchup(matchup_data_temp_week)
 
-        id_to_opf[manager['roster_id']] = running_total
+def load_roster_data(league_id):
+    rosters = load_table(f'rosters_{league_id}')
+    roster_players = load_table(f'roster_players_{league_id}')
+    # Roster tables written before owners were kept by user_id hold display names instead
+    if rosters is None or roster_players is None or 'user_id' not in rosters:
+        return None
 
-    return id_to_opf
+    players = roster_players['player_id'].astype(object).groupby(roster_players['roster_id'], sort=False).agg(list)
+    return pd.DataFrame({
+        'roster_id': rosters['roster_id'],
+        'owner_id': rosters['user_id'].astype(object),
+        'players': [players.get(roster_id, []) for roster_id in rosters['roster_id']],
+        'metadata': [{'record': record} for record in rosters['record'].astype(object)],
+    })
 
 
-def get_optimal_points_against():
-    id_to_opa = {}
+def get_roster_data(league_id):
+    # Rosters of a completed season never change, so they are read back from the roster tables once those were
+    # written after the season completed
+    league_info = get_league_info(league_id)
+    if league_info.get('status') == 'complete' and is_table_final(f'rosters_{league_id}') and \
+            is_table_final(f'roster_players_{league_id}'):
+        roster_data = load_roster_data(league_id)
+        if roster_data is not None:
+            return roster_data
 
-    for index, manager in roster_data.iterrows():
-        matchup_data_temp = matchup_data.copy()
+    # Make a request to https://api.sleeper.app/v1/league/<league_id>/rosters, owner_id is the owner's user_id
+    roster_data = pd.DataFrame(sleeper_get(f'/league/{league_id}/rosters'))
 
-        # Filter out the matchups entries with the manager's team
-        matchup_data_temp = matchup_data_temp[matchup_data_temp['roster_id'] != manager['roster_id']]
+    save_roster_tables(league_id, roster_data, league_info)
+    return roster_data
 
-        # Filter out the matchup entries where matchup id is not unique for the week
-        matchup_data_temp = matchup_data_temp.drop_duplicates(subset=['week', 'matchup_id'], keep=False)
 
-        running_total = 0
+def save_matchup_tables(league_id, matchups, player_points, league_info, first_week=1):
+    # Keep the weeks before first_week that were saved by earlier runs
+    if first_week > 1:
+        previous_matchups = load_table(f'matchups_{league_id}')
+        previous_player_points = load_table(f'player_points_{league_id}')
+        if previous_matchups is not None and previous_player_points is not None:
+            matchups = pd.concat([previous_matchups[previous_matchups['week'] < first_week], matchups])
+            player_points = pd.concat([previous_player_points[previous_player_points['week'] < first_week]
+                                       .astype({'player_id': object}), player_points])
 
-        for week in range(1, matchup_data_temp['week'].max() + 1):
-            matchup_data_temp_week = matchup_data_temp[matchup_data_temp['week'] == week]
-            running_total += get_optimal_roster_from_matchup(matchup_data_temp_week)
+    league_state = get_league_state(league_info)
+    save_table(f'matchups_{league_id}', matchups, MATCHUP_SCHEMA, league_state)
+    save_table(f'player_points_{league_id}', player_points, PLAYER_POINTS_SCHEMA, league_state)
 
-        id_to_opa[manager['roster_id']] = running_total
 
-    return id_to_opa
+def load_matchup_data(league_id, first_week=1):
+    # The matchups and player points of the weeks from first_week on, as the flat tables they were saved in
+    matchups = load_table(f'matchups_{league_id}')
+    player_points = load_table(f'player_points_{league_id}')
+    if matchups is None or player_points is None:
+        return None
 
+    return (matchups[matchups['week'] >= first_week].reset_index(drop=True),
+            player_points[player_points['week'] >= first_week].reset_index(drop=True))
 
-def get_matchup_data_remaining():
-    matchup_data_remaining_file = f'matchup_data_remaining_{LEAGUE_ID}.csv'  # Append league_id to the file name
 
+def get_matchup_data(league_id, first_week=1):
     # Get the league metadata to determine how many weeks the season has
-    req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}')
-    league_info = req.json()
+    league_info = get_league_info(league_id)
+
+    # Matchups of a completed season never change, so they are read back from the matchup tables once those were
+    # written after the season completed
+    if league_info.get('status') == 'complete' and is_table_final(f'matchups_{league_id}') and \
+            is_table_final(f'player_points_{league_id}'):
+        tables = load_matchup_data(league_id, first_week)
+        if tables is not None:
+            return tables
 
     # Determine the total number of weeks in the season
     total_weeks = league_info.get('settings', {}).get('playoff_week_start', 17) - 1
 
-    # Initialize an empty DataFrame for remaining matchup data
-    matchup_data = pd.DataFrame()
+    # Fetch all weeks of the season from first_week on concurrently, finalized weeks are cached forever
+    weeks = range(first_week, total_weeks + 1)
+    responses = sleeper_get_all([f'/league/{league_id}/matchups/{week}' for week in weeks],
+                                get_matchup_ttls(league_info, weeks))
 
-    # Iterate through remaining weeks of the season
-    for week in range(total_weeks + 1, 18):  # Adjust this range as needed
-        req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}/matchups/{week}')
-        week_data = pd.DataFrame(req.json())
+    week_frames = [pd.DataFrame(columns=MATCHUP_COLUMNS)]
+    for week, response in zip(weeks, responses):
+        week_data = pd.DataFrame(response)
         week_data['week'] = week
-        matchup_data = pd.concat([matchup_data, week_data])
-
-    # Save the data to a CSV file
-    matchup_data.to_csv(matchup_data_remaining_file, index=False)
-    return matchup_data
-
-
-def get_remaining_strength_of_schedule(statistics):
-    remaining_matchup_data = get_matchup_data_remaining()
-
-    id_to_rss = {}
+        week_frames.append(week_data)
+    matchup_data = pd.concat(week_frames, ignore_index=True)
+
+    # The nested players of each roster-week are flattened once here, everything after reads the flat tables
+    matchups = matchup_data[list(MATCHUP_SCHEMA)].astype(MATCHUP_SCHEMA)
+    player_points = explode_matchup_players(matchup_data)
+
+    # Save the data to the matchup tables
+    save_matchup_tables(league_id, matchups, player_points, league_info, first_week)
+
+    return matchups, player_points
+
+
+def build_opponent_index(lineups):
+    # Pairs every roster-week with its opponent's row for that week: (roster_id, week) plus each column of lineups
+    # again as opponent_<column>. Rows without a matchup_id (byes) or whose matchup_id is not shared by exactly two
+    # rosters have no opponent, and median games are not matchups so they never count as points against.
+    games = lineups[lineups['matchup_id'].notna()]
+    games = games[games.groupby(['week', 'matchup_id'])['roster_id'].transform('size') == 2]
+
+    opponents = games.merge(games, on=['week', 'matchup_id'], suffixes=('', '_opponent'))
+    opponents = opponents[opponents['roster_id'] != opponents['roster_id_opponent']]
+    opponents = opponents.rename(columns=lambda column: 'opponent_' + column[:-len('_opponent')]
+                                 if column.endswith('_opponent') else column)
+
+    return opponents.reset_index(drop=True)
+
+
+@functools.lru_cache(maxsize=None)
+def get_lineup_counts(roster_positions):
+    # Every way of splitting the starting slots between positions, per group of positions that share a slot (e.g.
+    # QB/RB/WR/TE through FLEX and SUPER_FLEX, DL/LB/DB through IDP_FLEX, K alone). No slot spans two groups, so the
+    # best lineup is the best split of every group independently and only the splits within a group are enumerated.
+    # Each group is (indices into positions, counts) where row i of counts holds how many players of each of its
+    # positions start. Only splits that can actually be assigned to slots are kept (Hall's condition over every subset
+    # of the group's positions), so taking the best split is exactly optimal however the flex slots overlap.
+    slots = [set(SLOT_POSITIONS[slot]) for slot in roster_positions if slot in SLOT_POSITIONS]
+    positions = sorted(set().union(*slots))
+
+    # Merge slots that share a position until the groups are disjoint
+    groups = []
+    for slot in slots:
+        overlapping = [group for group in groups if group & slot]
+        groups = [group for group in groups if not group & slot] + [set(slot).union(*overlapping)]
+
+    components = []
+    for group in sorted(groups, key=min):
+        group_positions = sorted(group)
+        group_slots = [slot for slot in slots if slot <= group]
+        max_counts = [sum(position in slot for slot in group_slots) for position in group_positions]
+        counts = np.array(list(itertools.product(*[range(n + 1) for n in max_counts])), dtype=np.int64)
+
+        subsets = np.array(list(itertools.product([0, 1], repeat=len(group_positions)))[1:], dtype=np.int64)
+        capacity = np.array([sum(any(group_positions[i] in slot for i in np.flatnonzero(subset))
+                                 for slot in group_slots) for subset in subsets])
+        feasible = ((counts @ subsets.T) <= capacity).all(axis=1)
+
+        indices = np.array([positions.index(position) for position in group_positions], dtype=np.int64)
+        components.append((indices, counts[feasible]))
+
+    return positions, components
+
+
+def explode_matchup_players(matchup_data):
+    # One row per rostered player per roster-week of the matchup responses, the rows of the player points table
+    player_lists = [players if isinstance(players, list) else [] for players in matchup_data['players']]
+    points_dicts = [points if isinstance(points, dict) else {} for points in matchup_data['players_points']]
+    starter_sets = [set(starters) if isinstance(starters, list) else set() for starters in matchup_data['starters']]
+    lengths = [len(players) for players in player_lists]
+
+    return pd.DataFrame({
+        'week': np.repeat(matchup_data['week'].to_numpy(dtype=np.int64), lengths),
+        'roster_id': np.repeat(matchup_data['roster_id'].to_numpy(dtype=np.int64), lengths),
+        'player_id': [player_id for players in player_lists for player_id in players],
+        'points': np.array([points.get(player_id, 0) for players, points in zip(player_lists, points_dicts)
+                            for player_id in players], dtype=float),
+        'starter': np.array([player_id in starters for players, starters in zip(player_lists, starter_sets)
+                             for player_id in players], dtype=bool),
+    })
 
-    for index, manager in roster_data.iterrows():
-        # use the roster id to get the remaining matchups
-        remaining_matchup_data_temp = remaining_matchup_data.copy()
 
-        # Filter out the matchups entries with the manager's team
-        remaining_matchup_data_temp = remaining_matchup_data_temp[remaining_matchup_data_temp['roster_id'] != manager['roster_id']]
+def optimize_lineups(groups, rows, codes, points, player_ids, components):
+    # Optimal points and optimal lineup of `groups` roster-weeks given as flat arrays with one entry per eligible
+    # player: the roster-week it belongs to, the index of its position in the positions of get_lineup_counts() and its
+    # points. components are the groups of positions and their lineup splits from get_lineup_counts().
+    positions = sum(len(indices) for indices, _ in components)
+
+    # best[g, p, k] is the sum of the k best players of position p in roster-week g, -inf when there are fewer than k
+    depth = np.zeros(positions, dtype=np.int64)
+    for indices, counts in components:
+        depth[indices] = counts.max(axis=0)
+    best = np.full((groups, positions, depth.max(initial=0) + 1), -np.inf)
+    best[:, :, 0] = 0
+
+    if len(rows):
+        order = np.lexsort((-points, codes, rows))
+        rows, codes, points, player_ids = rows[order], codes[order], points[order], player_ids[order]
+
+        group_start = np.r_[True, (rows[1:] != rows[:-1]) | (codes[1:] != codes[:-1])]
+        start_index = np.maximum.accumulate(np.where(group_start, np.arange(len(rows)), 0))
+        rank = np.arange(len(rows)) - start_index
+
+        cumulative = np.cumsum(points)
+        top_k = cumulative - (cumulative - points)[start_index]
+
+        keep = rank < depth[codes]
+        best[rows[keep], codes[keep], rank[keep] + 1] = top_k[keep]
+
+    # Prefer the splits that fill the most slots (a negative kicker still has to start), then the most points. Each
+    # group of positions is scored on its own, in chunks of roster-weeks sized so the scores of every split of the
+    # group stay within LINEUP_CHUNK_BYTES.
+    optimal_points = np.zeros(groups)
+    chosen_counts = np.zeros((groups, positions), dtype=np.int64)
+
+    for indices, counts in components:
+        filled = counts.sum(axis=1)
+        chunk_size = max(1, LINEUP_CHUNK_BYTES // (8 * counts.size))
+        for start in range(0, groups, chunk_size):
+            scores = best[start:start + chunk_size][:, indices[None, :], counts].sum(axis=2)
+            most_filled = np.where(np.isfinite(scores), filled, -1).max(axis=1, keepdims=True)
+            scores = np.where(filled == most_filled, scores, -np.inf)
+            choice = scores.argmax(axis=1)
+            optimal_points[start:start + chunk_size] += scores[np.arange(len(choice)), choice]
+            chosen_counts[start:start + chunk_size, indices] = counts[choice]
+
+    # The optimal lineup starts the best chosen_counts[g, p] players of each position p
+    lineup = [[] for _ in range(groups)]
+    if len(rows):
+        started = rank < chosen_counts[rows, codes]
+        for row, player_id in zip(rows[started], player_ids[started]):
+            lineup[row].append(player_id)
+
+    return optimal_points, lineup
+
+
+def compute_optimal_lineups(matchups, player_points, player_index, roster_positions=None):
+    # Optimal points for every (roster_id, week) row of matchups in one pass over the flat player points table, slot
+    # rules come from the league's roster_positions. Players of roster-weeks that are not in matchups are skipped.
+    if not roster_positions:
+        roster_positions = DEFAULT_ROSTER_POSITIONS
+    positions, components = get_lineup_counts(tuple(roster_positions))
+
+    lineups = matchups[['roster_id', 'week', 'matchup_id', 'points']].reset_index(drop=True)
+
+    rows = pd.MultiIndex.from_arrays([lineups['week'], lineups['roster_id']]).get_indexer(
+        pd.MultiIndex.from_arrays([player_points['week'], player_points['roster_id']]))
+    players = player_points[rows >= 0]
+    rows = rows[rows >= 0]
+
+    position_codes = lookup_players(player_index, list(players['player_id'].astype(object)))['position'].map(
+        {position: code for code, position in enumerate(positions)})
+    eligible = position_codes.notna().to_numpy()
+
+    rows = rows[eligible]
+    codes = position_codes.to_numpy()[eligible].astype(np.int64)
+    points = np.nan_to_num(players['points'].to_numpy(dtype=float)[eligible])
+    player_ids = players['player_id'].to_numpy(dtype=object)[eligible]
+
+    optimal_points, lineup = optimize_lineups(len(lineups), rows, codes, points, player_ids, components)
+
+    lineups['optimal_points'] = optimal_points
+    lineups['lineup'] = lineup
+    return lineups
+
+
+def get_lineup_config_hash(roster_positions):
+    # Identifies the starting slots of a league, the order of the slots does not change the optimal lineup
+    if not roster_positions:
+        roster_positions = DEFAULT_ROSTER_POSITIONS
+    starting_slots = sorted(slot for slot in roster_positions if slot in SLOT_POSITIONS)
+    return hashlib.sha1(','.join(starting_slots).encode('utf-8')).hexdigest()[:12]
+
+
+class ScoreStore:
+    # Memoized actual points, optimal points and optimal lineup per (league_id, week, roster_id, lineup config).
+    # Final weeks are appended to one JSON lines file per league, so later runs never recompute them. For
+    # --incremental a state file per league also records the last finalized week.
+    def __init__(self, store_dir=SCORE_STORE_DIR):
+        self.store_dir = store_dir
+        self.scores = {}
+        self.loaded = set()
+        self.lock = threading.Lock()
+
+    def get_store_file(self, league_id):
+        return os.path.join(self.store_dir, f'scores_{league_id}.jsonl')
+
+    def get_state_file(self, league_id):
+        return os.path.join(self.store_dir, f'state_{league_id}.json')
+
+    def load(self, league_id):
+        if self.store_dir is None or league_id in self.loaded:
+            return
+        self.loaded.add(league_id)
+
+        try:
+            with open(self.get_store_file(league_id)) as f:
+                for line in f:
+                    record = json.loads(line)
+                    self.scores[(league_id, record['week'], record['roster_id'], record['config'])] = record
+        except FileNotFoundError:
+            pass
+
+    def save(self, league_id, records):
+        if self.store_dir is None or not records:
+            return
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self.get_store_file(league_id), 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+    def get_lineups(self, league_id, league_info, matchups, player_points, player_index):
+        # Same table as compute_optimal_lineups(), only roster-weeks that are not final or not stored yet are computed
+        roster_positions = league_info.get('roster_positions') or DEFAULT_ROSTER_POSITIONS
+        config = get_lineup_config_hash(roster_positions)
+
+        lineups = matchups[['roster_id', 'week', 'matchup_id', 'points']].reset_index(drop=True)
+        keys = [(league_id, int(week), int(roster_id), config)
+                for week, roster_id in zip(lineups['week'], lineups['roster_id'])]
+        final = [is_week_final(league_info, key[1]) for key in keys]
+
+        # The lock is only held to read and add records, so the leagues of other threads are scored meanwhile
+        points = lineups['points'].to_numpy(dtype=float)
+        optimal_points = np.zeros(len(lineups))
+        lineup = [None] * len(lineups)
+        with self.lock:
+            self.load(league_id)
+            # A stored week whose actual points differ from the matchups was scored from data that was not final yet
+            stored = np.array([is_final and key in self.scores and self.scores[key]['points'] == week_points
+                               for key, is_final, week_points in zip(keys, final, points)], dtype=bool)
+            for position, key in zip(np.flatnonzero(stored), itertools.compress(keys, stored)):
+                optimal_points[position] = self.scores[key]['optimal_points']
+                lineup[position] = self.scores[key]['lineup']
+
+        computed = compute_optimal_lineups(lineups[~stored], player_points, player_index, roster_positions)
+        optimal_points[~stored] = computed['optimal_points'].to_numpy()
+        for position, computed_lineup in zip(np.flatnonzero(~stored), computed['lineup']):
+            lineup[position] = computed_lineup
+
+        records = {}
+        for key, is_final, (index, row) in zip(itertools.compress(keys, ~stored),
+                                               itertools.compress(final, ~stored), computed.iterrows()):
+            if not is_final:
+                continue
+            records[key] = {
+                'week': key[1],
+                'roster_id': key[2],
+                'config': config,
+                'matchup_id': None if pd.isna(row['matchup_id']) else int(row['matchup_id']),
+                'points': float(row['points']),
+                'optimal_points': float(row['optimal_points']),
+                'lineup': list(row['lineup']),
+            }
+
+        if records:
+            with self.lock:
+                self.scores.update(records)
+                self.save(league_id, list(records.values()))
+
+        lineups['optimal_points'] = optimal_points
+        lineups['lineup'] = lineup
+        return lineups
+
+    def get_stored_lineups(self, league_id, config, last_week):
+        # Rows of the optimal lineups table for weeks up to last_week, read back from the store
+        with self.lock:
+            self.load(league_id)
+            records = [record for (stored_league_id, week, roster_id, stored_config), record in self.scores.items()
+                       if stored_league_id == league_id and stored_config == config and week <= last_week]
+
+        return pd.DataFrame(records, columns=['roster_id', 'week', 'matchup_id', 'points', 'optimal_points', 'lineup'])
+
+    def load_state(self, league_id, config):
+        state = None
+        if self.store_dir is not None:
+            try:
+                with open(self.get_state_file(league_id)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        # Start over when the league changed its starting slots
+        if state is None or state['config'] != config:
+            state = {'config': config, 'last_final_week': 0}
+        return state
+
+    def update_state(self, league_id, league_info, lineups):
+        # Records the latest finalized week of lineups, so the next --incremental run starts after it
+        config = get_lineup_config_hash(league_info.get('roster_positions'))
+
+        with self.lock:
+            state = self.load_state(league_id, config)
+            final_weeks = [week for week in lineups['week'].unique() if is_week_final(league_info, week)]
+            if final_weeks and max(final_weeks) > state['last_final_week']:
+                state['last_final_week'] = int(max(final_weeks))
+                if self.store_dir is not None:
+                    os.makedirs(self.store_dir, exist_ok=True)
+                    write_file_atomically(self.get_state_file(league_id), json.dumps(state).encode('utf-8'))
+
+
+score_store = ScoreStore()
+
+
+def set_store_dir(store_dir):
+    # Moves the score store, the tables and the season store under store_dir. Scores loaded from the previous store are
+    # dropped with it.
+    global SCORE_STORE_DIR, TABLE_DIR, SEASON_STORE_DIR, score_store
+    SCORE_STORE_DIR = store_dir
+    TABLE_DIR = os.path.join(store_dir, 'tables')
+    SEASON_STORE_DIR = os.path.join(store_dir, 'seasons')
+    score_store = ScoreStore(store_dir)
+
+
+def get_season_file(league_id, top_k):
+    return os.path.join(SEASON_STORE_DIR, f'{league_id}_top{top_k}_v{SEASON_STORE_VERSION}.pkl')
+
+
+def load_completed_season(league_id, top_k):
+    try:
+        with open(get_season_file(league_id, top_k), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def save_completed_season(league_id, top_k, partial):
+    os.makedirs(SEASON_STORE_DIR, exist_ok=True)
+    write_file_atomically(get_season_file(league_id, top_k), pickle.dumps(partial))
+
+
+def get_last_scored_week(league_info):
+    # Last regular season week with final scores, every later week is still to be played
+    total_weeks = league_info.get('settings', {}).get('playoff_week_start', 17) - 1
+    if league_info.get('status') == 'complete':
+        return total_weeks
+    return min(league_info.get('settings', {}).get('last_scored_leg', 0), total_weeks)
+
+
+def fit_team_scores(lineups, roster_ids, last_scored_week):
+    # Mean and standard deviation of each team's weekly points over the weeks played so far. Teams with fewer than two
+    # games get the league-wide values, and before week 1 every game is a coin flip.
+    played = lineups[lineups['week'] <= last_scored_week]
+    fitted = played.groupby('roster_id')['points'].agg(['mean', 'std', 'count']).reindex(roster_ids)
+
+    league_mean = played['points'].mean() if len(played) else 0.0
+    league_std = played['points'].std() if len(played) > 1 else 1.0
+    few_games = ~(fitted['count'] >= 2)
+    means = fitted['mean'].where(~few_games, league_mean).to_numpy(dtype=float)
+    stds = fitted['std'].where(~few_games, league_std).to_numpy(dtype=float)
+    return np.nan_to_num(means, nan=league_mean), np.nan_to_num(stds, nan=league_std)
+
+
+def simulate_playoff_odds(league_info, roster_data, lineups, opponents, simulations=None, seed=None):
+    # Monte Carlo over the rest of the regular season: every team's weekly points are drawn from a normal fitted to its
+    # games so far, and the standings are ranked by wins then points for. Returns one row per roster_id with the share
+    # of simulations that make the playoffs, the mean seed and the mean expected points of the remaining opponents.
+    if simulations is None:
+        simulations = SIMULATIONS
+    if seed is None:
+        seed = SIMULATION_SEED
+
+    settings = league_info.get('settings', {})
+    total_weeks = settings.get('playoff_week_start', 17) - 1
+    last_scored_week = get_last_scored_week(league_info)
+    playoff_teams = settings.get('playoff_teams', DEFAULT_PLAYOFF_TEAMS)
+
+    roster_ids = roster_data['roster_id'].to_numpy()
+    team_index = {roster_id: index for index, roster_id in enumerate(roster_ids)}
+    teams = len(roster_ids)
+
+    wins = roster_data['metadata'].map(lambda x: str.count(x['record'], 'W')).to_numpy(dtype=float)
+    points_for = lineups[lineups['week'] <= last_scored_week].groupby('roster_id')['points'].sum() \
+        .reindex(roster_ids, fill_value=0).to_numpy(dtype=float)
+    means, stds = fit_team_scores(lineups, roster_ids, last_scored_week)
+
+    # One row per team per remaining game, each row holds the team, its opponent and the simulated week
+    remaining = opponents[(opponents['week'] > last_scored_week) & (opponents['week'] <= total_weeks) &
+                          opponents['roster_id'].isin(team_index) & opponents['opponent_roster_id'].isin(team_index)]
+    team = remaining['roster_id'].map(team_index).to_numpy(dtype=np.int64)
+    opponent = remaining['opponent_roster_id'].map(team_index).to_numpy(dtype=np.int64)
+    week = remaining['week'].to_numpy(dtype=np.int64) - last_scored_week - 1
+    remaining_weeks = total_weeks - last_scored_week
+
+    # Adds each game's result to its team's wins with one matrix product
+    credit = np.zeros((len(team), teams))
+    credit[np.arange(len(team)), team] = 1
+
+    games = np.bincount(team, minlength=teams)
+    remaining_strength = np.bincount(team, weights=means[opponent], minlength=teams)
+    remaining_strength = np.divide(remaining_strength, games, out=np.full(teams, np.nan), where=games > 0)
+
+    # Leagues that also play the weekly median add a win for every team scoring above it
+    median_games = settings.get('league_average_match') == 1
+
+    # Nothing is left to simulate once the regular season is over, the standings are final
+    if remaining_weeks <= 0:
+        simulations = 1
+
+    rng = np.random.default_rng(seed)
+    playoff_counts = np.zeros(teams)
+    seed_sums = np.zeros(teams)
+    for start in range(0, simulations, SIMULATION_CHUNK_SIZE):
+        size = min(SIMULATION_CHUNK_SIZE, simulations - start)
+        scores = rng.normal(means, stds, size=(size, max(remaining_weeks, 0), teams))
+
+        simulated_wins = wins + (scores[:, week, team] > scores[:, week, opponent]) @ credit
+        if median_games:
+            simulated_wins += (scores > np.median(scores, axis=2, keepdims=True)).sum(axis=1)
+        simulated_points = points_for + scores.sum(axis=1)
+
+        # Seeds of every simulated season, most wins first and points for breaking ties
+        order = np.lexsort((-simulated_points, -simulated_wins))
+        seeds = np.empty_like(order)
+        np.put_along_axis(seeds, order, np.arange(1, teams + 1)[None, :].repeat(size, axis=0), axis=1)
+
+        playoff_counts += (seeds <= playoff_teams).sum(axis=0)
+        seed_sums += seeds.sum(axis=0)
+
+    return pd.DataFrame({
+        'roster_id': roster_ids,
+        'playoff_odds': playoff_counts / simulations,
+        'expected_seed': seed_sums / simulations,
+        'remaining_strength_of_schedule': remaining_strength,
+    })
 
-        # Filter out the matchup entries where matchup id is not unique for the week
-        remaining_matchup_data_temp = remaining_matchup_data_temp.drop_duplicates(subset=['week', 'matchup_id'], keep=False)
 
-        running_total = 0
-        for week in range(1, remaining_matchup_data_temp['week'].max() + 1):
-            matchup_data_temp_week = remaining_matchup_data_temp[remaining_matchup_data_temp['week'] == week]
-            running_total += get_optimal_roster_from_matchup(matchup_data_temp_week)
+def get_team_weeks(league_info, lineups, opponents):
+    # One row per roster_id and completed regular season week with points_for, points_against, optimal_points_for and
+    # optimal_points_against. Weeks without an opponent (byes, median games only) have no points against.
+    weeks = lineups.loc[lineups['week'] <= get_last_scored_week(league_info),
+                        ['roster_id', 'week', 'points', 'optimal_points']]
+    weeks = weeks.merge(opponents[['roster_id', 'week', 'opponent_points', 'opponent_optimal_points']],
+                        on=['roster_id', 'week'], how='left')
+    weeks = weeks.rename(columns={'points': 'points_for', 'optimal_points': 'optimal_points_for',
+                                  'opponent_points': 'points_against',
+                                  'opponent_optimal_points': 'optimal_points_against'})
+    return weeks.astype({column: 'float64' for column in
+                         ['points_for', 'points_against', 'optimal_points_for', 'optimal_points_against']})
+
+
+def calculate_team_distributions(team_weeks):
+    # Totals and the distribution of every team's weekly points, one row per roster_id, all from one groupby
+    points = team_weeks[DISTRIBUTION_COLUMNS]
+    booms = (points > points.quantile(BOOM_QUANTILE)).where(points.notna()).add_suffix('_boom')
+    busts = (points < points.quantile(BUST_QUANTILE)).where(points.notna()).add_suffix('_bust')
+
+    # Byes have no points against, so they are neither a boom nor a bust
+    weeks = pd.concat([team_weeks.drop(columns=['week']), booms, busts], axis=1)
+    grouped = weeks.groupby('roster_id')
+    summary = grouped.agg(['sum', 'mean', 'std', 'var', 'median'])
+    # Before the first week is final there are no rows, and unstack() has no quantile columns to return
+    quantiles = grouped[DISTRIBUTION_COLUMNS].quantile([0.25, 0.75]).unstack() \
+        .reindex(columns=pd.MultiIndex.from_product([DISTRIBUTION_COLUMNS, [0.25, 0.75]]))
+
+    distributions = {column: summary[(column, 'sum')] for column in DISTRIBUTION_COLUMNS + ['optimal_points_against']}
+    for column in ['points_for', 'points_against']:
+        distributions[f'average_{column}'] = summary[(column, 'mean')]
+    for column in DISTRIBUTION_COLUMNS:
+        distributions[f'{column}_std'] = summary[(column, 'std')]
+        distributions[f'{column}_variance'] = summary[(column, 'var')]
+        distributions[f'{column}_median'] = summary[(column, 'median')]
+        distributions[f'{column}_p25'] = quantiles[(column, 0.25)]
+        distributions[f'{column}_p75'] = quantiles[(column, 0.75)]
+        # One minus the coefficient of variation, 100% is a team that scores the same every week
+        distributions[f'{column}_consistency'] = 1 - summary[(column, 'std')] / summary[(column, 'mean')]
+        distributions[f'{column}_boom_rate'] = summary[(f'{column}_boom', 'mean')]
+        distributions[f'{column}_bust_rate'] = summary[(f'{column}_bust', 'mean')]
+    return pd.DataFrame(distributions)
+
+
+def calculate_all_play(team_weeks, roster_ids):
+    # Every team against every other team in every completed week, from one week x team x team comparison of a week x
+    # team points matrix. Returns one row per roster_id with the all-play record, expected wins (the share of the
+    # league a team outscored each week it played a game, summed) and luck (head-to-head wins minus expected wins),
+    # and the head-to-head matrix of how many weeks the row team outscored the column team.
+    scores = team_weeks.pivot(index='week', columns='roster_id', values='points_for').reindex(columns=roster_ids)
+    points = scores.to_numpy(dtype=float)
+    has_game = team_weeks.pivot(index='week', columns='roster_id', values='points_against') \
+        .reindex(index=scores.index, columns=roster_ids).notna().to_numpy()
+
+    played = ~np.isnan(points)
+    pairs = played[:, :, None] & played[:, None, :] & ~np.eye(len(roster_ids), dtype=bool)
+    wins = (points[:, :, None] > points[:, None, :]) & pairs
+    ties = (points[:, :, None] == points[:, None, :]) & pairs
+
+    head_to_head = wins.sum(axis=0)
+    week_wins = wins.sum(axis=2)
+    week_ties = ties.sum(axis=2)
+    week_opponents = pairs.sum(axis=2)
+    win_share = np.divide(week_wins + 0.5 * week_ties, week_opponents, out=np.zeros(points.shape),
+                          where=week_opponents > 0)
+
+    # Actual head-to-head results over the same weeks, ties count half
+    games = team_weeks[team_weeks['points_against'].notna()]
+    actual_wins = ((games['points_for'] > games['points_against']) +
+                   0.5 * (games['points_for'] == games['points_against'])).groupby(games['roster_id']).sum()
+
+    all_play = pd.DataFrame({
+        'roster_id': roster_ids,
+        'all_play_wins': week_wins.sum(axis=0),
+        'all_play_losses': (week_opponents - week_wins - week_ties).sum(axis=0),
+        'all_play_ties': week_ties.sum(axis=0),
+        'expected_wins': (win_share * has_game).sum(axis=0),
+    })
+    all_play['all_play_percentage'] = (all_play['all_play_wins'] + 0.5 * all_play['all_play_ties']) / \
+        (all_play['all_play_wins'] + all_play['all_play_losses'] + all_play['all_play_ties'])
+    all_play['luck'] = actual_wins.reindex(roster_ids, fill_value=0).to_numpy() - all_play['expected_wins']
 
-        id_to_rss[manager['roster_id']] = running_total / remaining_matchup_data_temp['week'].count()
-    return id_to_rss
+    return all_play, pd.DataFrame(head_to_head, index=pd.Index(roster_ids, name='roster_id'), columns=roster_ids)
 
 
-def calculate_analytics():
-    id_to_points_for = get_total_points_for()
-    id_to_points_against = get_total_points_against()
-    optimal_points_for = get_optimal_points_for()
-    optimal_points_against = get_optimal_points_against()
+def calculate_analytics(roster_data, team_weeks, playoff_odds=None, all_play=None):
+    # Statistics of each team, numeric throughout, format_statistics() rounds them for printing
+    distributions = calculate_team_distributions(team_weeks).reindex(roster_data['roster_id'])
+    totals = ['points_for', 'points_against', 'optimal_points_for', 'optimal_points_against']
+    distributions[totals] = distributions[totals].fillna(0)
 
-    # Print the statistics for each team
     statistics = pd.DataFrame()
     statistics['owner_id'] = roster_data['owner_id']
     statistics['roster_id'] = roster_data['roster_id']
     statistics['wins'] = roster_data['metadata'].map(lambda x: str.count(x['record'], 'W'))
     statistics['losses'] = roster_data['metadata'].map(lambda x: str.count(x['record'], 'L'))
-
     statistics['win_percentage'] = statistics['wins'] / (statistics['wins'] + statistics['losses'])
-    statistics['win_percentage'] = statistics['win_percentage'].map(lambda x: "{:.2%}".format(x))
-
-    statistics['points_for'] = statistics['roster_id'].map(id_to_points_for)
-    statistics['points_for'] = statistics['points_for'].round(2)
-
-    statistics['points_against'] = statistics['roster_id'].map(id_to_points_against)
-    statistics['points_against'] = statistics['points_against'].round(2)
-
-    statistics['average_points_for'] = statistics['points_for'] / (statistics['wins'] + statistics['losses'])
-    statistics['average_points_for'] = statistics['average_points_for'].round(2)
-
-    statistics['average_points_against'] = statistics['points_against'] / (statistics['wins'] + statistics['losses'])
-    statistics['average_points_against'] = statistics['average_points_against'].round(2)
 
+    distributions.index = statistics.index
+    statistics = statistics.join(distributions)
     statistics['points_difference'] = statistics['points_for'] - statistics['points_against']
-    statistics['points_difference'] = statistics['points_difference'].round(2)
-
-    statistics['optimal_points_for'] = statistics['roster_id'].map(optimal_points_for)
-    statistics['optimal_points_for'] = statistics['optimal_points_for'].round(2)
-    #
-    statistics['optimal_points_against'] = statistics['roster_id'].map(optimal_points_against)
-    statistics['optimal_points_against'] = statistics['optimal_points_against'].round(2)
-    #
     statistics['efficiency_for'] = statistics['points_for'] / statistics['optimal_points_for']
-    statistics['efficiency_for'] = statistics['efficiency_for'].map(lambda x: "{:.2%}".format(x))
-
     statistics['efficiency_against'] = statistics['points_against'] / statistics['optimal_points_against']
-    statistics['efficiency_against'] = statistics['efficiency_against'].map(lambda x: "{:.2%}".format(x))
-
-    statistics = statistics.sort_values(by=['points_difference'], ascending=False)
-
-    # remaining_strength_of_schedule = get_remaining_strength_of_schedule(statistics)
-    # statistics['remaining_strength_of_schedule'] = statistics['roster_id'].map(remaining_strength_of_schedule)
-    # statistics['remaining_strength_of_schedule'] = statistics['remaining_strength_of_schedule'].round(2)
-
-    print(statistics)
-
-    # remove the roster_id column
-    statistics = statistics.drop(columns=['roster_id'])
-    statistics.to_csv('statistics.csv', index=False)
-
-    return statistics
-
-
-def calculate_worst_10_efficiency_weeks():
-    # Get the league metadata to determine how many weeks the season has and extract the year
-    req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}')
-    league_info = req.json()
-
-    # Determine the total number of weeks in the season
-    total_weeks = league_info.get('settings', {}).get('playoff_week_start', 17) - 1
 
-    # Extract the year from the league metadata ('season' field)
+    if playoff_odds is not None:
+        playoff_odds = playoff_odds.set_index('roster_id')
+        for column in ['playoff_odds', 'expected_seed', 'remaining_strength_of_schedule']:
+            statistics[column] = statistics['roster_id'].map(playoff_odds[column])
+
+    if all_play is not None:
+        all_play = all_play.set_index('roster_id')
+        for column in ALL_PLAY_COLUMNS:
+            statistics[column] = statistics['roster_id'].map(all_play[column])
+
+    # The headline columns first, then the distribution of each team's weekly points
+    columns = ['owner_id', 'roster_id', 'wins', 'losses', 'win_percentage', 'points_for', 'points_against',
+               'average_points_for', 'average_points_against', 'points_difference', 'optimal_points_for',
+               'optimal_points_against', 'efficiency_for', 'efficiency_against']
+    if playoff_odds is not None:
+        columns += ['playoff_odds', 'expected_seed', 'remaining_strength_of_schedule']
+    if all_play is not None:
+        columns += ALL_PLAY_COLUMNS
+    columns += [column for column in distributions.columns if column not in columns]
+
+    return statistics[columns].sort_values(by=['points_difference'], ascending=False)
+
+
+def format_statistics(statistics):
+    # Percentages as strings and every other float rounded to two decimals, for printing and the CSV
+    formatted = statistics.copy()
+    for column in formatted.columns:
+        if column in PERCENTAGE_COLUMNS:
+            formatted[column] = formatted[column].map(lambda x: "{:.2%}".format(x))
+        elif pd.api.types.is_float_dtype(formatted[column]):
+            formatted[column] = formatted[column].round(2)
+    return formatted
+
+
+class TopK:
+    # Keeps the k best entries seen so far in a bounded heap, the weakest kept entry sits on top of the heap so every
+    # push is O(log k). Leaderboards of different leagues are combined with merge().
+    counter = itertools.count()
+
+    def __init__(self, k, largest=True):
+        self.k = k
+        self.largest = largest
+        self.heap = []
+
+    def push(self, value, entry):
+        item = (value if self.largest else -value, next(TopK.counter), entry)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif item[0] > self.heap[0][0]:
+            heapq.heapreplace(self.heap, item)
+
+    def merge(self, other):
+        for value, order, entry in other.heap:
+            # Renumber entries, the counters of other processes may have handed out the same numbers
+            item = (value, next(TopK.counter), entry)
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, item)
+            elif item[0] > self.heap[0][0]:
+                heapq.heapreplace(self.heap, item)
+        return self
+
+    def results(self):
+        return [entry for value, order, entry in sorted(self.heap, key=lambda item: (-item[0], item[1]))]
+
+
+def calculate_leaderboards(league_info, roster_data, optimal_lineups, opponent_index, k=None):
+    if k is None:
+        k = TOP_K
+
+    # Get the year and the name of the league from its metadata
     league_year = league_info.get('season', 'Unknown')
-
     league_name = league_info.get('name', 'Unknown')
 
-    # Create a list to store data for all weeks that will be converted into a DataFrame
-    all_efficiency_data = []
-
-    for index, manager in roster_data.iterrows():
-        matchup_data_temp = matchup_data.copy()
-        matchup_data_temp = matchup_data_temp[matchup_data_temp['roster_id'] == manager['roster_id']]
-
-        # Iterate through weeks that have happened (<= total_weeks)
-        for week in range(1, total_weeks + 1):
-            matchup_data_temp_week = matchup_data_temp[matchup_data_temp['week'] == week]
-
-            if not matchup_data_temp_week.empty:
-                # Calculate actual points for and optimal points for the given week
-                actual_pf = matchup_data_temp_week['points'].sum()
-                max_pf = get_optimal_roster_from_matchup(matchup_data_temp_week)
-
-                # Skip the week if max_pf is 0
-                if max_pf == 0:
-                    continue
-
-                # Calculate efficiency for the week
-                efficiency_for_week = actual_pf / max_pf if max_pf > 0 else 0
-
-                # Calculate points missed out on for the week
-                points_missed = max_pf - actual_pf
-
-                # Append the data to the list, including the year
-                all_efficiency_data.append({
-                    'Team': manager['owner_id'],
-                    'Name': league_name,
-                    'Week': week,
-                    'Year': league_year,  # Add the league year to the data
-                    'Max PF': max_pf,
-                    'Actual PF': actual_pf,
-                    'Points Missed': points_missed,
-                    'Efficiency': efficiency_for_week,  # Store the actual numeric efficiency
-                    'roster_id': manager['roster_id']  # Store the roster_id to retrieve the worst team's lineup later
-                })
-
-    # Convert the list to a DataFrame
-    df_efficiency = pd.DataFrame(all_efficiency_data)
-
-    # Sort the DataFrame by Efficiency in ascending order
-    df_efficiency = df_efficiency.sort_values(by='Efficiency', ascending=True)
-
-    # Select the worst 10 weeks based on efficiency
-    df_worst_10_efficiency = df_efficiency.head(10)
-
-    # Convert Efficiency back to percentage format for display
-    df_worst_10_efficiency['Efficiency'] = df_worst_10_efficiency['Efficiency'].apply(lambda x: "{:.2%}".format(x))
-
-    return df_worst_10_efficiency
-
-
-def calculate_worst_10_weeks():
-    # Get the league metadata to determine how many weeks the season has and extract the year
-    req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}')
-    league_info = req.json()
-
-    # Determine the total number of weeks in the season
-    total_weeks = league_info.get('settings', {}).get('playoff_week_start', 17) - 1
-
-    # Extract the year from the league metadata ('season' field)
-    league_year = league_info.get('season', 'Unknown')
-
-    league_name = league_info.get('name', 'Unknown')
-
-    # Create a list to store data for all weeks that will be converted into a DataFrame
-    all_data = []
-
-    for index, manager in roster_data.iterrows():
-        matchup_data_temp = matchup_data.copy()
-        matchup_data_temp = matchup_data_temp[matchup_data_temp['roster_id'] == manager['roster_id']]
-
-        # Iterate through weeks that have happened (<= total_weeks)
-        for week in range(1, total_weeks + 1):
-            matchup_data_temp_week = matchup_data_temp[matchup_data_temp['week'] == week]
-
-            if not matchup_data_temp_week.empty and matchup_data_temp_week['points'].sum() > 0:
-                # Calculate actual points for the given week
-                actual_pf = matchup_data_temp_week['points'].sum()
-
-                # Append the data to the list, including the year
-                all_data.append({
-                    'Team': manager['owner_id'],
-                    'Name': league_name,
-                    'Week': week,
-                    'Year': league_year,  # Add the league year to the data
-                    'Actual PF': actual_pf,
-                    'roster_id': manager['roster_id']  # Store the roster_id to retrieve the worst team's lineup later
-                })
-
-    # Convert the list to a DataFrame
-    df = pd.DataFrame(all_data)
-
-    # Sort the DataFrame by Actual PF in ascending order
-    df = df.sort_values(by='Actual PF', ascending=True)
-
-    # Select the worst 10 weeks based on Actual PF
-    df_worst_10 = df.head(10)
-
-    return df_worst_10
-
-
-def calculate_best_10_weeks():
-    # Get the league metadata to determine how many weeks the season has and extract the year
-    req = requests.get(f'https://api.sleeper.app/v1/league/{LEAGUE_ID}')
-    league_info = req.json()
-
-    # Determine the total number of weeks in the season
-    total_weeks = league_info.get('settings', {}).get('playoff_week_start', 17) - 1
-
-    # Extract the year from the league metadata ('season' field)
-    league_year = league_info.get('season', 'Unknown')
-
-    league_name = league_info.get('name', 'Unknown')
-
-    # Create a list to store data for all weeks that will be converted into a DataFrame
-    all_data = []
-
-    for index, manager in roster_data.iterrows():
-        matchup_data_temp = matchup_data.copy()
-        matchup_data_temp = matchup_data_temp[matchup_data_temp['roster_id'] == manager['roster_id']]
-
-        # Iterate through weeks that have happened (<= total_weeks)
-        for week in range(1, total_weeks + 1):
-            matchup_data_temp_week = matchup_data_temp[matchup_data_temp['week'] == week]
-
-            if not matchup_data_temp_week.empty and matchup_data_temp_week['points'].sum() > 0:
-                # Calculate actual points for the given week
-                actual_pf = matchup_data_temp_week['points'].sum()
-
-                # Append the data to the list, including the year
-                all_data.append({
-                    'Team': manager['owner_id'],
-                    'Name': league_name,
-                    'Week': week,
-                    'Year': league_year,  # Add the league year to the data
-                    'Actual PF': actual_pf,
-                    'roster_id': manager['roster_id']  # Store the roster_id to retrieve the worst team's lineup later
-                })
-
-    # Convert the list to a DataFrame
-    df = pd.DataFrame(all_data)
-
-    # Sort the DataFrame by Actual PF in ascending order
-    df = df.sort_values(by='Actual PF', ascending=False)
-
-    # Select the worst 10 weeks based on Actual PF
-    df_best_10 = df.head(10)
-
-    return df_best_10
-
-
-
-def main():
-    global LEAGUE_IDS, LEAGUE_ID
-
-    if not LEAGUE_ID:
-        print("Please provide a league id")
+    leaderboards = {name: TopK(k, largest) for name, (title, column, largest) in LEADERBOARDS.items()}
+    owners = dict(zip(roster_data['roster_id'], roster_data['owner_id']))
+
+    # One pass over the weekly results, every week is offered to each leaderboard it qualifies for
+    weekly_results = optimal_lineups.merge(opponent_index[['roster_id', 'week', 'opponent_roster_id', 'opponent_points']],
+                                           on=['roster_id', 'week'], how='left')
+
+    for result in weekly_results.itertuples(index=False):
+        team = owners.get(result.roster_id)
+
+        # Weeks without any points have not been played yet
+        if result.points > 0:
+            week = {
+                'Team': team,
+                'Name': league_name,
+                'Week': result.week,
+                'Year': league_year,
+                'Actual PF': result.points,
+                'roster_id': result.roster_id,
+            }
+            leaderboards['worst_weeks'].push(result.points, week)
+            leaderboards['best_weeks'].push(result.points, week)
+
+        # Skip the week if no lineup could score
+        if result.optimal_points != 0:
+            efficiency = result.points / result.optimal_points if result.optimal_points > 0 else 0
+            points_missed = result.optimal_points - result.points
+            efficiency_week = {
+                'Team': team,
+                'Name': league_name,
+                'Week': result.week,
+                'Year': league_year,
+                'Max PF': result.optimal_points,
+                'Actual PF': result.points,
+                'Points Missed': points_missed,
+                'Efficiency': efficiency,
+                'roster_id': result.roster_id,
+            }
+            leaderboards['worst_efficiency_weeks'].push(efficiency, efficiency_week)
+            leaderboards['most_points_missed'].push(points_missed, efficiency_week)
+
+        if pd.notna(result.opponent_roster_id) and result.points > result.opponent_points:
+            margin = result.points - result.opponent_points
+            leaderboards['biggest_blowouts'].push(margin, {
+                'Team': team,
+                'Opponent': owners.get(result.opponent_roster_id),
+                'Name': league_name,
+                'Week': result.week,
+                'Year': league_year,
+                'Actual PF': result.points,
+                'Opponent PF': result.opponent_points,
+                'Margin': margin,
+                'roster_id': result.roster_id,
+            })
+
+    return leaderboards
+
+
+class PlayerWeekIndex:
+    # Points of every player that was on a roster of the league in each completed week, as player x week arrays built
+    # once from the league's player points table. Answers the queries behind trade and waiver suggestions. Players that
+    # were not on any roster in a week have no points for it.
+    def __init__(self, player_points, player_index, roster_positions=None, last_week=None):
+        if not roster_positions:
+            roster_positions = DEFAULT_ROSTER_POSITIONS
+        positions, self.components = get_lineup_counts(tuple(roster_positions))
+        self.positions = np.array(positions, dtype=object)
+        self.starting_slots = np.array([list(roster_positions).count(position) for position in self.positions])
+
+        if last_week is not None:
+            player_points = player_points[player_points['week'] <= last_week]
+        player_ids = pd.Categorical(player_points['player_id'].astype(object))
+        self.player_ids = np.array(player_ids.categories, dtype=object)
+        self.player_codes = {player_id: code for code, player_id in enumerate(self.player_ids)}
+        self.weeks = np.unique(player_points['week'].to_numpy())
+
+        codes = player_ids.codes
+        week_codes = np.searchsorted(self.weeks, player_points['week'].to_numpy())
+        shape = (len(self.player_ids), len(self.weeks))
+        self.points = np.full(shape, np.nan)
+        self.points[codes, week_codes] = player_points['points'].to_numpy(dtype=float)
+        self.roster = np.zeros(shape, dtype=np.int64)
+        self.roster[codes, week_codes] = player_points['roster_id'].to_numpy()
+        self.started = np.zeros(shape, dtype=bool)
+        self.started[codes, week_codes] = player_points['starter'].to_numpy(dtype=bool)
+
+        players = lookup_players(player_index, list(self.player_ids))
+        self.names = players['player_name'].to_numpy(dtype=object)
+        self.player_positions = players['position'].to_numpy(dtype=object)
+        self.position_codes = players['position'].map(
+            {position: code for code, position in enumerate(self.positions)}).fillna(-1).to_numpy(dtype=np.int64)
+
+        # Rosters as of the latest week, 0 for players that are not on a roster anymore
+        self.current_roster = self.roster[:, -1] if len(self.weeks) else np.zeros(len(self.player_ids), dtype=np.int64)
+        played = ~np.isnan(self.points)
+        self.points_per_week = np.divide(np.nansum(self.points, axis=1), played.sum(axis=1),
+                                         out=np.zeros(len(self.player_ids)), where=played.any(axis=1))
+
+    def players(self, codes):
+        return pd.DataFrame({
+            'player_id': self.player_ids[codes],
+            'player_name': self.names[codes],
+            'position': self.player_positions[codes],
+        })
+
+    def top_unstarted(self, k=None):
+        # The k highest scoring weeks of players that were on a roster but left on the bench
+        if k is None:
+            k = TOP_K
+        benched = (self.roster > 0) & ~self.started & ~np.isnan(self.points)
+        candidates = np.flatnonzero(benched)
+        points = self.points.ravel()[candidates]
+        if len(candidates) > k:
+            top = np.argpartition(-points, k - 1)[:k]
+            candidates, points = candidates[top], points[top]
+        order = np.argsort(-points, kind='stable')
+        codes, week_codes = np.unravel_index(candidates[order], self.points.shape)
+
+        unstarted = self.players(codes)
+        unstarted['roster_id'] = self.roster[codes, week_codes]
+        unstarted['week'] = self.weeks[week_codes]
+        unstarted['points'] = points[order]
+        return unstarted
+
+    def positional_scarcity(self):
+        # Each team's strength at every position from its current roster: the points per week of the players that
+        # would fill the position's starting slots and of its best backup. need is how far the starters trail the
+        # league average for the position, a team with a high need and one with a strong backup are trade partners.
+        rostered = np.flatnonzero((self.current_roster > 0) & (self.position_codes >= 0))
+        players = pd.DataFrame({
+            'roster_id': self.current_roster[rostered],
+            'position': self.positions[self.position_codes[rostered]],
+            'slots': self.starting_slots[self.position_codes[rostered]],
+            'points_per_week': self.points_per_week[rostered],
+        }).sort_values(['roster_id', 'position', 'points_per_week'], ascending=[True, True, False])
+        depth = players.groupby(['roster_id', 'position']).cumcount()
+        players['starter_points'] = players['points_per_week'].where(depth < players['slots'], 0)
+        players['backup_points'] = players['points_per_week'].where(depth == players['slots'], 0)
+
+        scarcity = players.groupby(['roster_id', 'position']).agg(
+            players=('points_per_week', 'size'), starting_slots=('slots', 'first'),
+            starter_points=('starter_points', 'sum'), backup_points=('backup_points', 'sum'))
+        # Positions a team has nobody at count as zero points
+        roster_ids = np.unique(self.current_roster[self.current_roster > 0])
+        scarcity = scarcity.reindex(pd.MultiIndex.from_product([roster_ids, self.positions],
+                                                               names=['roster_id', 'position']), fill_value=0)
+        scarcity['starting_slots'] = np.tile(self.starting_slots, len(roster_ids))
+        scarcity = scarcity.reset_index()
+        scarcity['need'] = scarcity.groupby('position')['starter_points'].transform('mean') - scarcity['starter_points']
+        return scarcity
+
+    def lineup_gains(self, roster_id, add=(), drop=()):
+        # Change of a team's optimal points per week from adding each player in add to its current roster, after
+        # dropping the players in drop (with no add, from dropping them alone). Every scenario is scored over every
+        # completed week in one call of the optimal lineup search.
+        current = np.flatnonzero(self.current_roster == roster_id)
+        kept = current[~np.isin(self.player_ids[current], list(drop))]
+        added = [[self.player_codes[player_id]] for player_id in add] if add else [[]]
+        scenarios = [current] + [np.r_[kept, codes].astype(np.int64) for codes in added]
+
+        # One entry per player of every scenario per week, roster-week g is week g % weeks of scenario g // weeks
+        weeks = len(self.weeks)
+        entries = np.concatenate(scenarios)
+        scenario_index = np.repeat(np.arange(len(scenarios)), [len(scenario) for scenario in scenarios])
+        codes = np.repeat(entries, weeks)
+        week_codes = np.tile(np.arange(weeks), len(entries))
+        rows = np.repeat(scenario_index, weeks) * weeks + week_codes
+
+        eligible = self.position_codes[codes] >= 0
+        codes, week_codes, rows = codes[eligible], week_codes[eligible], rows[eligible]
+        optimal_points, lineup = optimize_lineups(len(scenarios) * weeks, rows, self.position_codes[codes],
+                                                  np.nan_to_num(self.points[codes, week_codes]), codes, self.components)
+
+        per_week = optimal_points.reshape(len(scenarios), weeks).mean(axis=1) if weeks else np.zeros(len(scenarios))
+        return pd.Series(per_week[1:] - per_week[0], index=list(add) if add else ['drop'], name='gain')
+
+    def suggest_pickups(self, roster_id, k=3, drop=()):
+        # Players that are not on a roster anymore whose addition raises the team's optimal points per week the most,
+        # scored PICKUP_BATCH_SIZE players at a time
+        candidates = np.flatnonzero((self.current_roster == 0) & (self.position_codes >= 0))
+        if not len(candidates):
+            return self.players(candidates).assign(points_per_week=[], gain=[])
+        gains = np.concatenate([
+            self.lineup_gains(roster_id, add=list(self.player_ids[candidates[start:start + PICKUP_BATCH_SIZE]]),
+                              drop=drop).to_numpy()
+            for start in range(0, len(candidates), PICKUP_BATCH_SIZE)])
+        order = np.argsort(-gains, kind='stable')[:k]
+
+        pickups = self.players(candidates[order])
+        pickups['points_per_week'] = self.points_per_week[candidates[order]]
+        pickups['gain'] = gains[order]
+        return pickups
+
+
+def calculate_suggestions(roster_data, player_weeks, k=None):
+    # Best benched weeks of the league, every team's positional needs and its best pickups
+    pickups = [player_weeks.suggest_pickups(roster_id, PICKUP_SUGGESTIONS).assign(roster_id=roster_id)
+               for roster_id in roster_data['roster_id']]
+    return {
+        'unstarted': player_weeks.top_unstarted(k),
+        'scarcity': player_weeks.positional_scarcity(),
+        'pickups': pd.concat(pickups, ignore_index=True) if pickups else None,
+    }
+
+
+def calculate_moving_averages(league_info, roster_data, lineups):
+    # Week x team matrix of each team's rolling mean points over the weeks played so far, without the last one. The
+    # columns are the user_ids of the owners.
+    last_scored_week = get_last_scored_week(league_info)
+    played = lineups[lineups['week'] <= last_scored_week]
+    points = played.pivot(index='week', columns='roster_id', values='points').sort_index().iloc[:-1]
+
+    moving_averages = points.rolling(MOVING_AVERAGE_WINDOW).mean().dropna(how='all')
+    return moving_averages.rename(columns=dict(zip(roster_data['roster_id'], roster_data['owner_id'])))
+
+
+def render_moving_average_plot(moving_averages, title, file_name):
+    # Rendered with the headless Agg backend, matplotlib is only imported by the processes that draw
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    for owner in moving_averages.columns:
+        ax.plot(moving_averages.index, moving_averages[owner], label=owner, solid_capstyle='round',
+                solid_joinstyle='round')
+    ax.set_title(title)
+    ax.set_xlabel('Week')
+    ax.set_ylabel('Points')
+    ax.legend()
+    fig.savefig(file_name)
+    plt.close(fig)
+
+
+def render_plots(charts):
+    # Charts of different leagues are drawn in parallel worker processes, so many leagues do not wait on one another
+    if len(charts) <= 1:
+        for moving_averages, title, file_name in charts:
+            render_moving_average_plot(moving_averages, title, file_name)
         return
 
-    combined_team_stats = pd.DataFrame()
-
-    top_10_worst_efficiency_weeks = []
-    top_10_worst_weeks = []
-    top_10_best_weeks = []
-
-    for LEAGUE_ID in LEAGUE_IDS:
-        print(f"Analyzing league {LEAGUE_ID}")
-
-        # Reload global data for each league
-        global matchup_data, player_data, roster_data
-        player_data = get_player_data()
-        roster_data = get_roster_data()
-        matchup_data = get_matchup_data()
-
-        # Concatenate stats from each league
-        combined_team_stats = pd.concat([combined_team_stats, calculate_analytics()])
-
-        # Collect top 10 weeks data
-        top_10_worst_efficiency_weeks.append(calculate_worst_10_efficiency_weeks())
-        top_10_worst_weeks.append(calculate_worst_10_weeks())
-        top_10_best_weeks.append(calculate_best_10_weeks())
-
-    # After processing all leagues, group by owner_id to avoid duplication across leagues
-    combined_team_stats = combined_team_stats.groupby('owner_id', as_index=False).agg({
-        'wins': 'sum',
-        'losses': 'sum',
-        'points_for': 'sum',
-        'points_against': 'sum',
-        'optimal_points_for': 'sum',
-        'optimal_points_against': 'sum',
-        'points_difference': 'sum'
-    })
-
-    combined_team_stats['win_percentage'] = combined_team_stats['wins'] / (combined_team_stats['wins'] + combined_team_stats['losses'])
-    combined_team_stats['average_points_for'] = combined_team_stats['points_for'] / (combined_team_stats['wins'] + combined_team_stats['losses'])
-    combined_team_stats['average_points_against'] = combined_team_stats['points_against'] / (combined_team_stats['wins'] + combined_team_stats['losses'])
-    combined_team_stats['efficiency_for'] = combined_team_stats['points_for'] / combined_team_stats['optimal_points_for']
-    combined_team_stats['efficiency_against'] = combined_team_stats['points_against'] / combined_team_stats['optimal_points_against']
+    with ProcessPoolExecutor(max_workers=min(len(charts), os.cpu_count() or 1)) as executor:
+        list(executor.map(render_moving_average_plot, *zip(*charts)))
 
-    combined_team_stats = combined_team_stats.sort_values(by=['points_difference'], ascending=False)
 
-    # Recalculate aggregated metrics after combining all leagues
-    combined_team_stats['win_percentage'] = (combined_team_stats['wins'] / 
-                                             (combined_team_stats['wins'] + combined_team_stats['losses'])).map(lambda x: "{:.2%}".format(x))
+def print_suggestions(suggestions, owners):
+    print("Best weeks left on the bench")
+    unstarted = suggestions['unstarted']
+    print(unstarted.assign(roster_id=unstarted['roster_id'].map(owners)).rename(columns={'roster_id': 'team'}).round(2))
 
-    combined_team_stats['average_points_for'] = (combined_team_stats['points_for'] / 
-                                                 (combined_team_stats['wins'] + combined_team_stats['losses'])).round(2)
+    print("Positional need: points per week the starters trail the league average")
+    need = suggestions['scarcity'].pivot(index='roster_id', columns='position', values='need')
+    print(need.rename(index=owners).rename_axis(index=None, columns=None).round(2))
 
-    combined_team_stats['average_points_against'] = (combined_team_stats['points_against'] / 
-                                                     (combined_team_stats['wins'] + combined_team_stats['losses'])).round(2)
-
-    combined_team_stats['efficiency_for'] = (combined_team_stats['points_for'] / 
-                                             combined_team_stats['optimal_points_for']).map(lambda x: "{:.2%}".format(x))
-
-    combined_team_stats['efficiency_against'] = (combined_team_stats['points_against'] / 
-                                                 combined_team_stats['optimal_points_against']).map(lambda x: "{:.2%}".format(x))
+    print("Waiver pickups that add the most optimal points per week")
+    pickups = suggestions['pickups']
+    if pickups is None or pickups.empty:
+        print("No players left unrostered")
+    else:
+        print(pickups.assign(roster_id=pickups['roster_id'].map(owners)).rename(columns={'roster_id': 'team'})
+              .round(2).to_string(index=False))
+    print()
 
-    # Sort combined team stats by points_difference
-    combined_team_stats = combined_team_stats.sort_values(by=['points_difference'], ascending=False).reset_index(drop=True)
 
-    # Process top 10 worst and best weeks across all leagues
-    combined_worst_efficiency_weeks = pd.concat(top_10_worst_efficiency_weeks).sort_values(by='Efficiency', ascending=True).head(10)
-    combined_worst_weeks = pd.concat(top_10_worst_weeks).sort_values(by='Actual PF', ascending=True).head(10)
-    combined_best_weeks = pd.concat(top_10_best_weeks).sort_values(by='Actual PF', ascending=False).head(10)
+def format_leaderboard(leaderboard):
+    df = pd.DataFrame(leaderboard.results())
+    for column in ['Team', 'Opponent']:
+        if column in df:
+            df[column] = df[column].map(user_directory.get_names(set(df[column])))
+    if 'Efficiency' in df:
+        df['Efficiency'] = df['Efficiency'].map(lambda x: "{:.2%}".format(x))
+    return df
+
+
+class LeagueAnalyzer:
+    # Analyzes Sleeper leagues and keeps what it loaded for later calls: the player index is loaded once a day and a
+    # completed season never changes, so its data is loaded once. One analyzer can be shared by many threads, different
+    # leagues are analyzed concurrently and concurrent calls for the same league wait for a single load.
+    def __init__(self, top_k=None, incremental=None):
+        self.top_k = TOP_K if top_k is None else top_k
+        self.incremental = INCREMENTAL if incremental is None else incremental
+        self.player_index = None
+        self.player_index_loaded_at = 0
+        self.leagues = {}
+        self.league_locks = {}
+        self.lock = threading.Lock()
+        # Held while the players dump is downloaded and parsed, so get_league_lock() and the leagues already loaded do
+        # not wait for the daily refresh
+        self.player_index_lock = threading.Lock()
+
+    def get_player_index(self):
+        # player_id -> (full_name, position), shared by every league
+        with self.player_index_lock:
+            if self.player_index is None or \
+                    time.time() - self.player_index_loaded_at >= get_cache_ttl('/players/nfl'):
+                self.player_index = build_player_index(get_player_data())
+                self.player_index_loaded_at = time.time()
+            return self.player_index
+
+    def get_league_lock(self, league_id):
+        with self.lock:
+            return self.league_locks.setdefault(league_id, threading.Lock())
+
+    def prefetch(self, league_ids):
+        # Warm the cache for many leagues at once before analyzing them one by one. Completed seasons that are in the
+        # season store need nothing from the API.
+        league_ids = [league_id for league_id in league_ids
+                      if not os.path.exists(get_season_file(league_id, self.top_k))]
+        prefetch_leagues(league_ids, self.incremental)
+
+    def load_league(self, league_id):
+        # Rosters, matchups, optimal lineups, opponents and per-team totals of one league
+        with self.get_league_lock(league_id):
+            league = self.leagues.get(league_id)
+            if league is None:
+                league = self.read_league(league_id)
+                if league['league_info'].get('status') == 'complete':
+                    self.leagues[league_id] = league
+            return league
+
+    def read_league(self, league_id):
+        with profiler.stage('parse'):
+            player_index = self.get_player_index()
+            league_info = get_league_info(league_id)
+            roster_data = get_roster_data(league_id)
+            user_directory.load_league(league_id, roster_data['owner_id'])
+
+        if self.incremental:
+            # Only weeks after the last finalized one are fetched and scored, earlier weeks come from the score store
+            config = get_lineup_config_hash(league_info.get('roster_positions'))
+            first_week = get_first_week_to_fetch(league_id, league_info, self.incremental)
+            with profiler.stage('parse'):
+                matchups, player_points = get_matchup_data(league_id, first_week=first_week)
+            with profiler.stage('lineup_optimization'):
+                optimal_lineups = pd.concat([score_store.get_stored_lineups(league_id, config, first_week - 1),
+                                             score_store.get_lineups(league_id, league_info, matchups, player_points,
+                                                                     player_index)],
+                                            ignore_index=True)
+            score_store.update_state(league_id, league_info, optimal_lineups)
+        else:
+            with profiler.stage('parse'):
+                matchups, player_points = get_matchup_data(league_id)
+            with profiler.stage('lineup_optimization'):
+                optimal_lineups = score_store.get_lineups(league_id, league_info, matchups, player_points,
+                                                          player_index)
+
+        with profiler.stage('aggregation'):
+            opponent_index = build_opponent_index(optimal_lineups)
+            team_weeks = get_team_weeks(league_info, optimal_lineups, opponent_index)
+
+        with profiler.stage('simulation'):
+            playoff_odds = simulate_playoff_odds(league_info, roster_data, optimal_lineups, opponent_index)
+
+        return {
+            'league_id': league_id,
+            'league_info': league_info,
+            'roster_data': roster_data,
+            'player_points': player_points,
+            'optimal_lineups': optimal_lineups,
+            'opponent_index': opponent_index,
+            'team_weeks': team_weeks,
+            'playoff_odds': playoff_odds,
+        }
+
+    def forget(self, league_id):
+        # Drop a completed season kept by load_league(), e.g. when a caller evicts the league from its own cache
+        with self.get_league_lock(league_id):
+            self.leagues.pop(league_id, None)
+
+    def analyze(self, league_id, suggestions=None):
+        # Analyze one league into a partial result that can be merged with other leagues: per-team sums and counts,
+        # the league's statistics table and its leaderboards, plus its suggestions with --suggestions. Completed
+        # seasons are analyzed once and then read back from the season store.
+        league = None
+        partial = load_completed_season(league_id, self.top_k)
+        if partial is None:
+            league = self.load_league(league_id)
+            partial = self.summarize(league)
+            if league['league_info'].get('status') == 'complete':
+                save_completed_season(league_id, self.top_k, partial)
+
+        # Suggestions are never kept in the season store
+        if SUGGESTIONS if suggestions is None else suggestions:
+            partial['suggestions'] = self.suggest(league or self.load_league(league_id))
+        return partial
+
+    def suggest(self, league):
+        # Trade and waiver suggestions of a league loaded by load_league(), only computed when asked for. The player by
+        # week index behind them is built here and not kept with the league.
+        league_id = league['league_id']
+        league_info = league['league_info']
+        with profiler.stage('aggregation'):
+            # Every week of the league is in its player points table, also when only newer weeks were fetched
+            player_points = load_table(f'player_points_{league_id}')
+            if player_points is None:
+                player_points = league['player_points']
+            player_weeks = PlayerWeekIndex(player_points, self.get_player_index(), league_info.get('roster_positions'),
+                                           get_last_scored_week(league_info))
+            return calculate_suggestions(league['roster_data'], player_weeks, self.top_k)
+
+    def summarize(self, league):
+        # The partial result of analyze() for a league loaded by load_league()
+        league_id = league['league_id']
+
+        with profiler.stage('aggregation'):
+            all_play, head_to_head = calculate_all_play(league['team_weeks'], league['roster_data']['roster_id'].to_numpy())
+            statistics = calculate_analytics(league['roster_data'], league['team_weeks'], league['playoff_odds'],
+                                             all_play)
+            leaderboards = calculate_leaderboards(league['league_info'], league['roster_data'],
+                                                  league['optimal_lineups'], league['opponent_index'], self.top_k)
+            moving_averages = calculate_moving_averages(league['league_info'], league['roster_data'],
+                                                        league['optimal_lineups'])
+
+        league_info = league['league_info']
+        plot_title = (f"{MOVING_AVERAGE_WINDOW}-Week Moving Average with Rounded Line Segments\n"
+                      f"{league_info.get('name', 'Unknown')} {league_info.get('season', 'Unknown')}")
+
+        return {
+            'league_id': league_id,
+            'statistics': statistics,
+            'team_totals': statistics[TEAM_TOTAL_COLUMNS],
+            'head_to_head': head_to_head,
+            'leaderboards': leaderboards,
+            'moving_averages': moving_averages,
+            'plot_title': plot_title,
+        }
+
+
+# Analyzer of a --jobs worker process, forked workers inherit the one of the main process with its player index
+worker = {'analyzer': None}
+
+
+def init_worker(args):
+    # Worker processes that are spawned instead of forked start from the defaults, so they are configured again.
+    # Forked workers also inherit the main process's session, whose pooled connections the main process still uses,
+    # and its rate limiter, so each worker starts its own session with an equal share of the rate limit.
+    global RATE_LIMIT_PER_MINUTE, session_lock
+    configure(args)
+    RATE_LIMIT_PER_MINUTE = max(1, RATE_LIMIT_PER_MINUTE // max(1, JOBS))
+    session_lock = threading.Lock()
+    http_session['session'] = None
+    http_session['rate_limiter'] = None
+
+
+def analyze_league(league_id):
+    # Entry point of the --jobs worker processes. The profiler only counts the league being analyzed, so main() can
+    # merge the counters of every league.
+    if worker['analyzer'] is None:
+        worker['analyzer'] = LeagueAnalyzer()
+    profiler.reset()
+    partial = worker['analyzer'].analyze(league_id)
+    partial['profile'] = profiler.snapshot()
+    return partial
+
+
+def get_peak_rss():
+    # Peak resident memory of this process and of the largest finished worker process, in bytes
+    if resource is None:
+        return None, None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def write_profile_report(file_name, league_ids, wall_seconds, cpu_seconds):
+    # Stage times are summed over leagues, with --jobs they add up to more than the wall time of the run.
+    # cpu_seconds only covers the main process, worker CPU time is in the stages.
+    snapshot = profiler.snapshot()
+    http = snapshot['http']
+    lookups = http['cache_hits'] + http['cache_revalidations'] + http['cache_misses']
+    peak_rss, peak_worker_rss = get_peak_rss()
+
+    report = {
+        'league_ids': league_ids,
+        'jobs': JOBS,
+        'incremental': INCREMENTAL,
+        'wall_seconds': wall_seconds,
+        'cpu_seconds': cpu_seconds,
+        'stages': snapshot['stages'],
+        'http': http | {
+            'cache_hit_rate': http['cache_hits'] / lookups if lookups else None,
+            # Share of responses that were not downloaded again, fresh from the cache or revalidated with a 304
+            'cache_reuse_rate': (http['cache_hits'] + http['cache_revalidations']) / lookups if lookups else None,
+        },
+        'endpoints': snapshot['endpoints'],
+        'peak_rss_bytes': peak_rss,
+        'peak_worker_rss_bytes': peak_worker_rss,
+        'tracemalloc_peak_bytes': tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+    }
+
+    with open(file_name, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def build_parser(description):
+    # Options of the settings configure() applies, shared by main.py and service.py. Options only main.py has keep
+    # their defaults in the service.
+    parser = argparse.ArgumentParser(description=description)
+    parser.set_defaults(jobs=JOBS, suggestions=False, history=False, profile=None, cprofile=None, tracemalloc=None)
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY,
+                        help='Maximum number of concurrent requests to the Sleeper API')
+    parser.add_argument('--rate-limit', type=int, default=RATE_LIMIT_PER_MINUTE,
+                        help='Maximum number of requests per minute to the Sleeper API')
+    parser.add_argument('--top-k', type=int, default=TOP_K, help='Number of weeks kept on each best/worst week leaderboard')
+    parser.add_argument('--simulations', type=int, default=SIMULATIONS,
+                        help='Number of simulated seasons behind the playoff odds')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only fetch and score weeks newer than the last finalized week stored for each league')
+    parser.add_argument('--base-url', default=SLEEPER_API,
+                        help='Sleeper API to talk to, e.g. a local sleeper_stub.py server')
+    parser.add_argument('--record', metavar='DIR', help='Save every Sleeper response used by the run as a fixture in DIR')
+    parser.add_argument('--replay', metavar='DIR', help='Read every Sleeper response from the fixtures in DIR, offline')
+    parser.add_argument('--store-dir', metavar='DIR',
+                        help=f'Directory of the score store, tables and season store ({SCORE_STORE_DIR} by default, a '
+                             f'temporary directory with --record or --replay)')
+    return parser
+
+
+def parse_args(argv=None):
+    parser = build_parser("Analyze and visualize data from multiple Sleeper fantasy football leagues")
+    parser.add_argument('league_ids', nargs='+', type=str, help='List of league ids to analyze (e.g., 12345 67890)')
+    parser.add_argument('--jobs', type=int, default=JOBS, help='Number of leagues analyzed in parallel worker processes')
+    parser.add_argument('--suggestions', action='store_true',
+                        help='Print the best benched weeks, positional needs and waiver pickups of every team')
+    parser.add_argument('--history', action='store_true',
+                        help="Also analyze every earlier season of each league, following its previous_league_id")
+    parser.add_argument('--profile', nargs='?', const='profile.json', metavar='FILE',
+                        help='Write per-stage timings, HTTP and cache counters and peak memory to a JSON report '
+                             '(profile.json by default)')
+    parser.add_argument('--cprofile', metavar='FILE', help='Dump cProfile stats of the main process to FILE')
+    parser.add_argument('--tracemalloc', metavar='FILE', help='Dump a tracemalloc snapshot of the main process to FILE')
+    return parser.parse_args(argv)
+
+
+def make_temp_store_dir(args):
+    # Recorded and replayed runs start from empty stores instead of .sleeper_store: a replay only depends on the
+    # fixtures, and a recording fetches and saves every response the analysis needs instead of skipping the ones of
+    # stored seasons and tables. Worker processes are configured from args, so they share the directory.
+    if (args.replay is None and args.record is None) or args.store_dir is not None:
+        return None
+    args.store_dir = tempfile.mkdtemp(prefix='sleeper_run_')
+    return args.store_dir
+
+
+def configure(args):
+    # Applies the command line to the module settings, they are shared by every analyzer in the process
+    global MAX_CONCURRENCY, RATE_LIMIT_PER_MINUTE, TOP_K, JOBS, SIMULATIONS, INCREMENTAL, SLEEPER_API, RECORD_DIR
+    global REPLAY_DIR, PROFILE_FILE, CPROFILE_FILE, TRACEMALLOC_FILE, SUGGESTIONS
+    MAX_CONCURRENCY = args.concurrency
+    RATE_LIMIT_PER_MINUTE = args.rate_limit
+    TOP_K = args.top_k
+    JOBS = args.jobs
+    SIMULATIONS = args.simulations
+    INCREMENTAL = args.incremental
+    SLEEPER_API = args.base_url.rstrip('/')
+    RECORD_DIR = args.record
+    REPLAY_DIR = args.replay
+    PROFILE_FILE = args.profile
+    CPROFILE_FILE = args.cprofile
+    TRACEMALLOC_FILE = args.tracemalloc
+    SUGGESTIONS = args.suggestions
+    if args.store_dir is not None:
+        set_store_dir(args.store_dir)
+
+
+def main(argv=None):
+    global user_directory
+    args = parse_args(argv)
+
+    previous_store_dir = SCORE_STORE_DIR
+    temp_store_dir = make_temp_store_dir(args)
+    configure(args)
+    try:
+        run(args)
+    finally:
+        # Later runs in the same process start from the usual store and do not see the names of this run's leagues
+        if args.store_dir is not None:
+            set_store_dir(previous_store_dir)
+        if temp_store_dir is not None:
+            user_directory = UserDirectory()
+            shutil.rmtree(temp_store_dir, ignore_errors=True)
+
+
+def run(args):
+    # The analysis of main() once the module is configured from args
+    league_ids = args.league_ids
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if CPROFILE_FILE is not None:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    if TRACEMALLOC_FILE is not None:
+        tracemalloc.start()
+
+    team_totals = []
+    charts = []
+    leaderboards = {name: TopK(TOP_K, largest) for name, (title, column, largest) in LEADERBOARDS.items()}
+
+    analyzer = LeagueAnalyzer()
+    with profiler.stage('fetch'):
+        if args.history:
+            league_ids = get_league_history(league_ids)
+        analyzer.prefetch(league_ids)
+
+    # Loaded before the worker processes start, so forked workers inherit the player index
+    with profiler.stage('parse'):
+        analyzer.get_player_index()
+
+    if JOBS > 1:
+        worker['analyzer'] = analyzer
+        executor = ProcessPoolExecutor(max_workers=JOBS, initializer=init_worker, initargs=(args,))
+        partials = executor.map(analyze_league, league_ids)
+    else:
+        executor = None
+        partials = map(analyzer.analyze, league_ids)
+
+    for partial in partials:
+        # Worker processes count their leagues in their own profiler
+        if executor is not None:
+            profiler.merge(partial['profile'])
+        # Names are resolved in the main process from the league's members, in the order of league_ids
+        user_directory.load_league(partial['league_id'], partial['statistics']['owner_id'])
+
+        with profiler.stage('output'):
+            print(f"Analyzing league {partial['league_id']}")
+            statistics = with_display_names(format_statistics(partial['statistics']))
+            print(statistics)
+
+            # remove the roster_id column
+            owners = dict(zip(statistics['roster_id'], statistics['display_name']))
+            statistics = statistics.drop(columns=['roster_id'])
+            statistics.to_csv('statistics.csv', index=False)
+
+            print("All-play head-to-head: weeks the row team outscored the column team")
+            print(partial['head_to_head'].rename(index=owners, columns=owners).rename_axis(index=None))
+
+            if SUGGESTIONS:
+                print_suggestions(partial['suggestions'], owners)
+
+        with profiler.stage('aggregation'):
+            # Collect sums and counts from each league
+            team_totals.append(partial['team_totals'])
+
+            # Merge this league's best and worst weeks into the leaderboards across all leagues
+            for name, leaderboard in partial['leaderboards'].items():
+                leaderboards[name].merge(leaderboard)
+
+        # One moving average plot per league, suffixed with the league id when there are several
+        file_name = MOVING_AVERAGE_PLOT
+        if len(league_ids) > 1:
+            base, extension = os.path.splitext(MOVING_AVERAGE_PLOT)
+            file_name = f"{base}_{partial['league_id']}{extension}"
+        moving_averages = partial['moving_averages']
+        charts.append((moving_averages.rename(columns=user_directory.get_names(moving_averages.columns)),
+                       partial['plot_title'], file_name))
+
+    if executor is not None:
+        executor.shutdown()
+
+    with profiler.stage('plot'):
+        render_plots(charts)
+
+    with profiler.stage('aggregation'):
+        combined_team_stats = pd.concat(team_totals)
+
+        # After processing all leagues, group by owner_id to avoid duplication across leagues. owner_id is the user_id,
+        # so a renamed user stays one owner and different users with the same name stay apart.
+        combined_team_stats = combined_team_stats.groupby('owner_id', as_index=False, dropna=False).agg({
+            'wins': 'sum',
+            'losses': 'sum',
+            'points_for': 'sum',
+            'points_against': 'sum',
+            'optimal_points_for': 'sum',
+            'optimal_points_against': 'sum',
+            'points_difference': 'sum',
+            'all_play_wins': 'sum',
+            'all_play_losses': 'sum',
+            'all_play_ties': 'sum',
+            'expected_wins': 'sum',
+            'luck': 'sum'
+        })
+
+        games = combined_team_stats['wins'] + combined_team_stats['losses']
+        combined_team_stats['win_percentage'] = combined_team_stats['wins'] / games
+        combined_team_stats['average_points_for'] = combined_team_stats['points_for'] / games
+        combined_team_stats['average_points_against'] = combined_team_stats['points_against'] / games
+        combined_team_stats['efficiency_for'] = combined_team_stats['points_for'] / combined_team_stats['optimal_points_for']
+        combined_team_stats['efficiency_against'] = combined_team_stats['points_against'] / combined_team_stats['optimal_points_against']
+        combined_team_stats['all_play_percentage'] = (combined_team_stats['all_play_wins'] + 0.5 * combined_team_stats['all_play_ties']) / \
+            (combined_team_stats['all_play_wins'] + combined_team_stats['all_play_losses'] + combined_team_stats['all_play_ties'])
+
+        # Sort combined team stats by points_difference
+        combined_team_stats = combined_team_stats.sort_values(by=['points_difference'], ascending=False).reset_index(drop=True)
 
     # Display the results
-    print()
-    print("Combined team stats")
-    print(combined_team_stats)
-    print()
-    print("Top 10 worst efficiency weeks across all years")
-    print(combined_worst_efficiency_weeks)
-    print()
-    print("Top 10 worst weeks across all years")
-    print(combined_worst_weeks)
-    print()
-    print("Top 10 best weeks across all years")
-    print(combined_best_weeks)
-    print()
+    with profiler.stage('output'):
+        print()
+        print("Combined team stats")
+        print(with_display_names(format_statistics(combined_team_stats)))
+        print()
+        for name, (title, column, largest) in LEADERBOARDS.items():
+            print(title.format(k=TOP_K))
+            print(format_leaderboard(leaderboards[name]))
+            print()
+
+    if CPROFILE_FILE is not None:
+        cprofile.disable()
+        cprofile.dump_stats(CPROFILE_FILE)
+    if PROFILE_FILE is not None:
+        write_profile_report(PROFILE_FILE, league_ids, time.perf_counter() - wall_start,
+                             time.process_time() - cpu_start)
+        print(f"Profile written to {PROFILE_FILE}")
+    if TRACEMALLOC_FILE is not None:
+        tracemalloc.take_snapshot().dump(TRACEMALLOC_FILE)
+        tracemalloc.stop()
 
 
 
@@ -0,0 +1,283 @@
+import json
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import main as analytics
+
+# /leagues/<league_id>[/statistics | /leaderboards | /suggestions | /teams | /teams/<roster_id>]
+ROUTE = re.compile(r'^/leagues/(\d+)(?:/(statistics|leaderboards|suggestions|teams)(?:/(\d+))?)?/?$')
+
+
+class LeagueNotFound(Exception):
+    pass
+
+
+def to_records(df):
+    # JSON-ready rows, numpy numbers become plain numbers and NaN becomes null
+    return json.loads(df.to_json(orient='records'))
+
+
+def lazy(compute):
+    # Calls compute on first use only, concurrent callers wait for the same value
+    value = []
+    lock = threading.Lock()
+
+    def get():
+        with lock:
+            if not value:
+                value.append(compute())
+        return value[0]
+
+    return get
+
+
+def build_suggestions(analyzer, league):
+    suggestions = analyzer.suggest(league)
+    return {name: [] if table is None else to_records(table) for name, table in suggestions.items()}
+
+
+def build_result(analyzer, league_id):
+    # Everything the endpoints serve for one league, computed once per load so requests only serialize it
+    try:
+        league_info = analytics.get_league_info(league_id)
+    except FileNotFoundError:
+        league_info = None
+    except Exception as e:
+        if getattr(getattr(e, 'response', None), 'status_code', None) == 404:
+            league_info = None
+        else:
+            raise
+    if league_info is None:
+        raise LeagueNotFound(league_id)
+
+    league = analyzer.load_league(league_id)
+    partial = analyzer.summarize(league)
+    roster_data = league['roster_data']
+    owners = dict(zip(roster_data['roster_id'], roster_data['owner_id']))
+    names = analytics.user_directory.get_names(roster_data['owner_id'])
+
+    statistics = to_records(analytics.with_display_names(partial['statistics']))
+    leaderboards = {}
+    for name, (title, column, largest) in analytics.LEADERBOARDS.items():
+        leaderboard = pd.DataFrame(partial['leaderboards'][name].results())
+        for owner_column in ['Team', 'Opponent']:
+            if owner_column in leaderboard:
+                leaderboard[owner_column] = leaderboard[owner_column].map(names)
+        leaderboards[name] = {'title': title.format(k=analyzer.top_k), 'weeks': to_records(leaderboard)}
+
+    # Week by week results of every team, with the opponent of each week
+    weeks = league['optimal_lineups'].merge(
+        league['opponent_index'][['roster_id', 'week', 'opponent_roster_id', 'opponent_points']],
+        on=['roster_id', 'week'], how='left').sort_values(['roster_id', 'week'])
+    weeks['opponent'] = weeks['opponent_roster_id'].map(owners).map(names)
+
+    team_statistics = {row['roster_id']: row for row in statistics}
+    head_to_head = partial['head_to_head']
+    teams = {}
+    for roster_id, team_weeks in weeks.groupby('roster_id'):
+        teams[str(roster_id)] = {
+            'roster_id': int(roster_id),
+            'owner_id': owners.get(roster_id),
+            'display_name': names.get(owners.get(roster_id)),
+            'statistics': team_statistics.get(int(roster_id)),
+            # Weeks this team outscored each other team of the league
+            'head_to_head': {str(opponent): int(wins) for opponent, wins in head_to_head.loc[roster_id].items()
+                             if opponent != roster_id},
+            'weeks': to_records(team_weeks.drop(columns=['roster_id'])),
+        }
+
+    return {
+        'league': {
+            'league_id': league_id,
+            'name': league_info.get('name'),
+            'season': league_info.get('season'),
+            'status': league_info.get('status'),
+            'loaded_at': time.time(),
+        },
+        'live': league_info.get('status') != 'complete',
+        'statistics': statistics,
+        'leaderboards': leaderboards,
+        # Only computed when /suggestions is first requested
+        'suggestions': lazy(lambda: build_suggestions(analyzer, league)),
+        'teams': teams,
+    }
+
+
+class LeagueCache:
+    # LRU of per-league results. Concurrent requests for a league that is not loaded yet wait for a single load, and
+    # reloading a league keeps serving its previous result until the new one is ready.
+    def __init__(self, load, max_leagues, on_evict=None):
+        self.load = load
+        self.max_leagues = max_leagues
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def get(self, league_id):
+        with self.lock:
+            result = self.entries.get(league_id)
+            if result is not None:
+                self.entries.move_to_end(league_id)
+                return result
+        return self.reload(league_id)
+
+    def reload(self, league_id):
+        with self.lock:
+            future = self.loading.get(league_id)
+            leader = future is None
+            if leader:
+                future = self.loading[league_id] = Future()
+
+        if leader:
+            try:
+                result = self.load(league_id)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                self.put(league_id, result)
+                future.set_result(result)
+            finally:
+                with self.lock:
+                    del self.loading[league_id]
+
+        return future.result()
+
+    def put(self, league_id, result):
+        with self.lock:
+            self.entries[league_id] = result
+            self.entries.move_to_end(league_id)
+            evicted = []
+            while len(self.entries) > self.max_leagues:
+                evicted.append(self.entries.popitem(last=False)[0])
+
+        if self.on_evict is not None:
+            for evicted_league_id in evicted:
+                self.on_evict(evicted_league_id)
+
+    def get_live_leagues(self):
+        with self.lock:
+            return [league_id for league_id, result in self.entries.items() if result['live']]
+
+    def __contains__(self, league_id):
+        with self.lock:
+            return league_id in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+def refresh_live_leagues(cache, interval):
+    # Reload leagues whose season is still going, completed seasons never change. Weeks that are final come from the
+    # cache and the score store, so a refresh only fetches and scores the live weeks.
+    while True:
+        time.sleep(interval)
+        for league_id in cache.get_live_leagues():
+            if league_id not in cache:
+                continue
+            try:
+                cache.reload(league_id)
+            except Exception as e:
+                print(f"Refreshing league {league_id} failed: {e}")
+
+
+def make_handler(cache):
+    class LeagueServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/health':
+                self.send_json(200, {'status': 'ok', 'leagues': len(cache)})
+                return
+
+            match = ROUTE.match(path)
+            if match is None:
+                self.send_json(404, {'error': f'Unknown endpoint {path}'})
+                return
+            league_id, endpoint, roster_id = match.groups()
+
+            try:
+                result = cache.get(league_id)
+            except LeagueNotFound:
+                self.send_json(404, {'error': f'League {league_id} not found'})
+                return
+            except Exception as e:
+                self.send_json(502, {'error': f'Loading league {league_id} failed: {e}'})
+                return
+
+            if endpoint is None:
+                self.send_json(200, result['league'])
+            elif endpoint == 'teams' and roster_id is not None:
+                team = result['teams'].get(roster_id)
+                if team is None:
+                    self.send_json(404, {'error': f'Roster {roster_id} not found in league {league_id}'})
+                else:
+                    self.send_json(200, team)
+            elif endpoint == 'teams':
+                self.send_json(200, list(result['teams'].values()))
+            elif endpoint == 'suggestions':
+                try:
+                    suggestions = result['suggestions']()
+                except Exception as e:
+                    self.send_json(500, {'error': f'Suggestions for league {league_id} failed: {e}'})
+                    return
+                self.send_json(200, suggestions)
+            else:
+                self.send_json(200, result[endpoint])
+
+        def log_message(self, format, *args):
+            pass
+
+    return LeagueServiceHandler
+
+
+def main():
+    parser = analytics.build_parser("Serve the analysis of Sleeper leagues as JSON over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-leagues', type=int, default=64, help='Number of leagues kept in memory')
+    parser.add_argument('--refresh-interval', type=float, default=300,
+                        help='Seconds between background reloads of leagues whose season is still going')
+    args = parser.parse_args()
+
+    temp_store_dir = analytics.make_temp_store_dir(args)
+    analytics.configure(args)
+
+    analyzer = analytics.LeagueAnalyzer()
+    cache = LeagueCache(lambda league_id: build_result(analyzer, league_id), args.max_leagues,
+                        on_evict=analyzer.forget)
+
+    # The players dump is shared by every league, so it is loaded before the first request
+    analyzer.get_player_index()
+
+    refresher = threading.Thread(target=refresh_live_leagues, args=(cache, args.refresh_interval), daemon=True)
+    refresher.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(cache))
+    print(f"Serving league analytics on http://{args.host}:{args.port}/leagues/<league_id>")
+    try:
+        server.serve_forever()
+    finally:
+        if temp_store_dir is not None:
+            shutil.rmtree(temp_store_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
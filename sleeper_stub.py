@@ -0,0 +1,100 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import synthetic
+
+
+def load_fixtures(fixture_dir):
+    # Fixtures recorded with `main.py --record DIR`: <dir>/league/<league_id>/matchups/1.json is served as
+    # /v1/league/<league_id>/matchups/1
+    responses = {}
+    for root, dirs, files in os.walk(fixture_dir):
+        for file_name in files:
+            if not file_name.endswith('.json'):
+                continue
+            file_path = os.path.join(root, file_name)
+            path = '/' + os.path.relpath(file_path, fixture_dir)[:-len('.json')].replace(os.sep, '/')
+            with open(file_path, 'rb') as f:
+                responses[path] = f.read()
+    return responses
+
+
+def make_handler(responses, latency):
+    class SleeperStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            # Simulated round trip to the real API
+            if latency:
+                time.sleep(latency)
+
+            path = self.path.split('?')[0]
+            if path.startswith('/v1/'):
+                path = path[len('/v1'):]
+
+            body = responses.get(path)
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', '4')
+                self.end_headers()
+                self.wfile.write(b'null')
+                return
+
+            # Conditional requests get a 304 when the response did not change
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SleeperStubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Sleeper API serving recorded or synthetic leagues")
+    parser.add_argument('--fixtures', metavar='DIR', help='Serve the fixtures recorded with main.py --record DIR')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N', help='Serve N synthetic leagues')
+    parser.add_argument('--seasons', type=int, default=1, help='Seasons of each synthetic league')
+    parser.add_argument('--teams', type=int, default=12, help='Teams in each synthetic league')
+    parser.add_argument('--weeks', type=int, default=17, help='Regular season weeks in each synthetic league')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic leagues')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering each request')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    responses = {}
+    if args.fixtures:
+        responses.update(load_fixtures(args.fixtures))
+    if args.synthetic:
+        league_ids, synthetic_responses = synthetic.generate_leagues(args.synthetic, seasons=args.seasons,
+                                                                     teams=args.teams, weeks=args.weeks,
+                                                                     seed=args.seed)
+        responses.update({path: json.dumps(response).encode('utf-8')
+                          for path, response in synthetic_responses.items()})
+        print(f"Synthetic leagues: {' '.join(league_ids)}")
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(responses, args.latency))
+    print(f"Serving {len(responses)} responses on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
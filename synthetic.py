@@ -0,0 +1,134 @@
+import random
+
+# Share of the player universe at each position, and the mean and standard deviation of a player's weekly points
+POSITION_SHARES = {'QB': 0.12, 'RB': 0.22, 'WR': 0.30, 'TE': 0.12, 'K': 0.12, 'DEF': 0.12}
+POSITION_POINTS = {'QB': (18, 7), 'RB': (11, 7), 'WR': (11, 7), 'TE': (8, 5), 'K': (8, 4), 'DEF': (7, 6)}
+
+# Superflex starting lineup followed by the bench
+ROSTER_POSITIONS = ['QB', 'RB', 'RB', 'WR', 'WR', 'TE', 'FLEX', 'SUPER_FLEX', 'K', 'DEF']
+
+
+def generate_players(count=2000, seed=0):
+    # Same shape as /v1/players/nfl: player_id -> player
+    rng = random.Random(seed)
+    positions = list(POSITION_SHARES)
+    weights = list(POSITION_SHARES.values())
+
+    players = {}
+    for index in range(count):
+        player_id = str(1000 + index)
+        position = rng.choices(positions, weights)[0]
+        players[player_id] = {
+            'player_id': player_id,
+            'full_name': f'Player {player_id}',
+            'first_name': 'Player',
+            'last_name': player_id,
+            'position': position,
+            'fantasy_positions': [position],
+            'team': rng.choice(['ARI', 'BUF', 'DAL', 'KC', 'PHI', 'SF']),
+            'status': 'Active',
+        }
+    return players
+
+
+def generate_league(league_id, players, teams=12, weeks=17, roster_size=25, scored_weeks=None, season='2023',
+                    previous_league_id=None, owner_prefix=None, seed=0):
+    # All responses of one league, keyed by API path. Weeks after scored_weeks have a schedule but no points yet.
+    # Seasons of the same league share an owner_prefix, so they have the same managers.
+    rng = random.Random(f'{league_id}-{seed}')
+    if scored_weeks is None:
+        scored_weeks = weeks
+    if owner_prefix is None:
+        owner_prefix = league_id
+
+    player_ids = list(players)
+    rng.shuffle(player_ids)
+
+    users = []
+    rosters = []
+    for team in range(teams):
+        user_id = f'{owner_prefix}{team:03d}'
+        record = ''.join(rng.choice('WL') for _ in range(scored_weeks))
+        users.append({'user_id': user_id, 'display_name': f'manager_{user_id}', 'metadata': {}})
+        rosters.append({
+            'roster_id': team + 1,
+            'owner_id': user_id,
+            'league_id': league_id,
+            'players': player_ids[team * roster_size:(team + 1) * roster_size],
+            'settings': {'wins': record.count('W'), 'losses': record.count('L'), 'ties': 0},
+            'metadata': {'record': record},
+        })
+
+    responses = {
+        f'/league/{league_id}': {
+            'league_id': league_id,
+            'name': f'Synthetic League {league_id}',
+            'season': season,
+            'status': 'complete' if scored_weeks >= weeks else 'in_season',
+            'total_rosters': teams,
+            'previous_league_id': previous_league_id,
+            'roster_positions': ROSTER_POSITIONS + ['BN'] * max(roster_size - len(ROSTER_POSITIONS), 0),
+            'settings': {'playoff_week_start': weeks + 1, 'leg': scored_weeks + 1, 'last_scored_leg': scored_weeks,
+                         'playoff_teams': 6},
+        },
+        f'/league/{league_id}/rosters': rosters,
+        f'/league/{league_id}/users': users,
+    }
+    for user in users:
+        responses[f'/user/{user["user_id"]}'] = user
+
+    for week in range(1, weeks + 1):
+        order = list(range(teams))
+        rng.shuffle(order)
+
+        matchups = []
+        for slot, team in enumerate(order):
+            roster = rosters[team]
+            if week <= scored_weeks:
+                players_points = {player_id: round(rng.gauss(*POSITION_POINTS[players[player_id]['position']]), 2)
+                                  for player_id in roster['players']}
+            else:
+                players_points = {player_id: 0 for player_id in roster['players']}
+            starters = roster['players'][:len(ROSTER_POSITIONS)]
+
+            matchups.append({
+                'roster_id': roster['roster_id'],
+                'matchup_id': slot // 2 + 1,
+                'points': round(sum(players_points[player_id] for player_id in starters), 2),
+                'players': roster['players'],
+                'players_points': players_points,
+                'starters': starters,
+                'starters_points': [players_points[player_id] for player_id in starters],
+                'custom_points': None,
+            })
+        responses[f'/league/{league_id}/matchups/{week}'] = matchups
+
+    return responses
+
+
+def generate_leagues(count=1, seasons=1, teams=12, weeks=17, roster_size=25, players=2000, scored_weeks=None,
+                     seed=0):
+    # Responses of `count` leagues, each with `seasons` seasons linked through previous_league_id, sharing one player
+    # universe of `players` players. Also returns the generated league ids, oldest season first. Only the latest
+    # season is cut off at scored_weeks, earlier seasons are complete.
+    if teams * roster_size > players:
+        raise ValueError(f"{teams} rosters of {roster_size} players need at least {teams * roster_size} players")
+
+    player_universe = generate_players(players, seed=seed)
+    responses = {'/players/nfl': player_universe}
+
+    league_ids = []
+    for index in range(count):
+        previous_league_id = None
+        for season in range(seasons):
+            league_id = str(900000000000000000 + seed * 100000 + index * 100 + season)
+            latest = season == seasons - 1
+            responses.update(generate_league(league_id, player_universe, teams=teams, weeks=weeks,
+                                             roster_size=roster_size, scored_weeks=scored_weeks if latest else None,
+                                             season=str(2024 - seasons + 1 + season),
+                                             previous_league_id=previous_league_id,
+                                             owner_prefix=f'{seed}{index:04d}', seed=seed))
+            league_ids.append(league_id)
+            previous_league_id = league_id
+
+    return league_ids, responses
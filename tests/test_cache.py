@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+
+
+class Response:
+    def __init__(self, status_code, content=b'', etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {'ETag': etag} if etag else {}
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    # Serves the current body of each path with its ETag, and a 304 when the request already has that ETag
+    def __init__(self):
+        self.bodies = {}
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        path = url[len(main.SLEEPER_API):]
+        self.requests.append((path, dict(headers or {})))
+        body = self.bodies[path]
+        etag = str(hash(body))
+        if (headers or {}).get('If-None-Match') == etag:
+            return Response(304)
+        return Response(200, body, etag)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    session = Session()
+    monkeypatch.setattr(main, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setitem(main.cache_size, 'bytes', None)
+    monkeypatch.setattr(main, 'get_session', lambda: (session, main.RateLimiter(60000, burst=1000)))
+    now = [1000.0]
+    monkeypatch.setattr(main.time, 'time', lambda: now[0])
+    session.now = now
+    return session
+
+
+def age(session, seconds):
+    session.now[0] += seconds
+
+
+def cache_bytes():
+    return sum(size for _, size, _ in main.get_cache_entries())
+
+
+def test_live_responses_are_fresh_for_their_ttl(session):
+    session.bodies['/league/1/matchups/3'] = b'[1]'
+
+    assert main.fetch_cached('/league/1/matchups/3') == b'[1]'
+    age(session, main.get_cache_ttl('/league/1/matchups/3') - 1)
+    assert main.fetch_cached('/league/1/matchups/3') == b'[1]'
+
+    assert len(session.requests) == 1
+
+
+def test_stale_responses_are_revalidated(session):
+    session.bodies['/league/1/rosters'] = b'[1]'
+    main.fetch_cached('/league/1/rosters')
+
+    # Unchanged: a 304 keeps the cached body and makes it fresh again
+    age(session, main.get_cache_ttl('/league/1/rosters'))
+    assert main.fetch_cached('/league/1/rosters') == b'[1]'
+    assert 'If-None-Match' in session.requests[-1][1]
+    assert main.fetch_cached('/league/1/rosters') == b'[1]'
+    assert len(session.requests) == 2
+
+    # Changed: the new body replaces the cached one
+    session.bodies['/league/1/rosters'] = b'[2]'
+    age(session, main.get_cache_ttl('/league/1/rosters'))
+    assert main.fetch_cached('/league/1/rosters') == b'[2]'
+    assert len(session.requests) == 3
+
+
+def test_final_responses_are_fresh_forever(session):
+    session.bodies['/league/1/matchups/1'] = b'[1]'
+    main.fetch_cached('/league/1/matchups/1', main.CACHE_FOREVER)
+
+    age(session, 365 * 24 * 60 * 60)
+    assert main.fetch_cached('/league/1/matchups/1', main.CACHE_FOREVER) == b'[1]'
+    assert len(session.requests) == 1
+
+
+def test_responses_cached_before_their_week_was_final_are_revalidated_once(session):
+    session.bodies['/league/1/matchups/5'] = b'[0]'
+    main.fetch_cached('/league/1/matchups/5')
+
+    # The week became final within the live TTL, with its final points
+    session.bodies['/league/1/matchups/5'] = b'[120]'
+    age(session, 60)
+    assert main.fetch_cached('/league/1/matchups/5', main.CACHE_FOREVER) == b'[120]'
+
+    age(session, 365 * 24 * 60 * 60)
+    assert main.fetch_cached('/league/1/matchups/5', main.CACHE_FOREVER) == b'[120]'
+    assert len(session.requests) == 2
+
+
+def test_immutable_responses_are_never_revalidated(session):
+    session.bodies['/league/1'] = b'{"status": "complete"}'
+    main.fetch_cached('/league/1')
+    main.mark_immutable('/league/1')
+
+    age(session, 365 * 24 * 60 * 60)
+    main.fetch_cached('/league/1')
+    assert len(session.requests) == 1
+
+
+def test_overwritten_responses_keep_the_tracked_size_right(session, monkeypatch):
+    monkeypatch.setattr(main, 'CACHE_MAX_BYTES', 10 ** 9)
+    for body in [b'x' * 100, b'y' * 300, b'z' * 50]:
+        session.bodies['/league/1/rosters'] = body
+        age(session, main.get_cache_ttl('/league/1/rosters'))
+        main.fetch_cached('/league/1/rosters')
+
+    # Only the meta files differ from what was tracked, by the few bytes of their ETags and timestamps
+    assert abs(main.cache_size['bytes'] - cache_bytes()) < 100
+
+
+def test_eviction_drops_the_least_recently_used_responses(session, monkeypatch):
+    for week in range(1, 4):
+        session.bodies[f'/league/1/matchups/{week}'] = b'w' * 1000
+        main.fetch_cached(f'/league/1/matchups/{week}')
+        age(session, 1)
+        os.utime(main.get_cache_paths(main.SLEEPER_API + f'/league/1/matchups/{week}')[0], (week, week))
+
+    # A response still being written by another process is neither counted nor evicted
+    with open(os.path.join(main.CACHE_DIR, 'partial.tmp'), 'wb') as f:
+        f.write(b't' * 5000)
+
+    monkeypatch.setattr(main, 'CACHE_MAX_BYTES', 2500)
+    session.bodies['/league/1/matchups/4'] = b'w' * 1000
+    main.fetch_cached('/league/1/matchups/4')
+
+    cached = [os.path.exists(main.get_cache_paths(main.SLEEPER_API + f'/league/1/matchups/{week}')[0])
+              for week in range(1, 5)]
+    assert cached == [False, False, True, True]
+    assert os.path.exists(os.path.join(main.CACHE_DIR, 'partial.tmp'))
+    assert main.cache_size['bytes'] == cache_bytes() <= main.CACHE_MAX_BYTES
+    assert json.load(open(main.get_cache_paths(main.SLEEPER_API + '/league/1/matchups/4')[1]))['final'] is False
@@ -0,0 +1,94 @@
+import itertools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+
+IDP_ROSTER_POSITIONS = ('QB', 'RB', 'RB', 'WR', 'WR', 'WR', 'TE', 'FLEX', 'FLEX', 'SUPER_FLEX', 'K', 'DEF',
+                        'DL', 'DL', 'LB', 'LB', 'DB', 'DB', 'IDP_FLEX', 'IDP_FLEX', 'IDP_FLEX')
+
+ROSTER_POSITIONS = [
+    tuple(main.DEFAULT_ROSTER_POSITIONS),
+    ('QB', 'RB', 'WR', 'TE', 'WRRB_FLEX', 'REC_FLEX', 'FLEX', 'K'),
+    ('QB', 'QB', 'SUPER_FLEX', 'SUPER_FLEX', 'TE'),
+    ('DL', 'LB', 'DB', 'IDP_FLEX', 'IDP_FLEX', 'K', 'DEF'),
+]
+
+
+def can_start(slots, positions):
+    # Whether every player of positions gets a slot of its own, by augmenting paths
+    slot_player = {}
+
+    def assign(player, seen):
+        for slot, eligible in enumerate(slots):
+            if positions[player] in eligible and slot not in seen:
+                seen.add(slot)
+                if slot not in slot_player or assign(slot_player[slot], seen):
+                    slot_player[slot] = player
+                    return True
+        return False
+
+    return all(assign(player, set()) for player in range(len(positions)))
+
+
+def brute_force(roster_positions, players):
+    # Most filled slots, then most points, over every set of players that can start together
+    slots = [main.SLOT_POSITIONS[slot] for slot in roster_positions if slot in main.SLOT_POSITIONS]
+    best = (0, 0)
+    for size in range(1, len(players) + 1):
+        for started in itertools.combinations(players, size):
+            if can_start(slots, [position for position, _ in started]):
+                best = max(best, (size, sum(points for _, points in started)))
+    return best[1]
+
+
+def optimize(roster_positions, weeks):
+    # Optimal points and lineup of each list of (position, points) in weeks, one roster-week per list. Players are
+    # identified by their index in the flattened weeks.
+    positions, components = main.get_lineup_counts(roster_positions)
+    rows = np.array([row for row, players in enumerate(weeks) for _ in players], dtype=np.int64)
+    codes = np.array([positions.index(position) for players in weeks for position, _ in players], dtype=np.int64)
+    points = np.array([points for players in weeks for _, points in players], dtype=float)
+    optimal_points, lineup = main.optimize_lineups(len(weeks), rows, codes, points, np.arange(len(rows)), components)
+    return points, optimal_points, lineup
+
+
+@pytest.mark.parametrize('roster_positions', ROSTER_POSITIONS)
+def test_optimal_points_match_brute_force(roster_positions):
+    rng = np.random.default_rng(0)
+    positions, _ = main.get_lineup_counts(roster_positions)
+    weeks = [[(positions[rng.integers(len(positions))], round(float(rng.uniform(-5, 30)), 2))
+              for _ in range(rng.integers(0, 8))] for _ in range(25)]
+
+    points, optimal_points, lineup = optimize(roster_positions, weeks)
+
+    for players, expected, started in zip(weeks, optimal_points, lineup):
+        assert expected == pytest.approx(brute_force(roster_positions, players))
+        assert points[started].sum() == pytest.approx(expected)
+
+
+def test_idp_lineup_splits_are_enumerated_per_group():
+    positions, components = main.get_lineup_counts(IDP_ROSTER_POSITIONS)
+
+    groups = [[positions[index] for index in indices] for indices, _ in components]
+    assert sorted(groups) == [['DB', 'DL', 'LB'], ['DEF'], ['K'], ['QB', 'RB', 'TE', 'WR']]
+    assert sum(len(counts) for _, counts in components) < 1000
+
+
+def test_idp_lineup_chunks_stay_within_budget(monkeypatch):
+    monkeypatch.setattr(main, 'LINEUP_CHUNK_BYTES', 2 ** 20)
+    rng = np.random.default_rng(1)
+    positions, _ = main.get_lineup_counts(IDP_ROSTER_POSITIONS)
+    weeks = [[(positions[rng.integers(len(positions))], float(rng.uniform(0, 30))) for _ in range(30)]
+             for _ in range(200)]
+
+    _, optimal_points, lineup = optimize(IDP_ROSTER_POSITIONS, weeks)
+
+    slots = len([slot for slot in IDP_ROSTER_POSITIONS if slot in main.SLOT_POSITIONS])
+    assert all(len(started) <= slots for started in lineup)
+    assert np.all(np.isfinite(optimal_points))
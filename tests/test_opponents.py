@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+
+NO_GAME = None
+
+# (week, roster_id, matchup_id, points, expected opponent). Week 1 has a roster without a matchup_id (median game
+# only), week 2 a matchup_id shared by three rosters, week 3 a bye without any row for roster 1 and week 4 is not
+# scored yet.
+LINEUPS = [
+    (1, 1, 1, 100.0, 2), (1, 2, 1, 90.0, 1), (1, 3, 2, 80.0, 4), (1, 4, 2, 120.0, 3), (1, 5, None, 70.0, NO_GAME),
+    (2, 1, 1, 100.0, NO_GAME), (2, 2, 1, 110.0, NO_GAME), (2, 3, 1, 105.0, NO_GAME), (2, 4, 2, 95.0, 5),
+    (2, 5, 2, 85.0, 4),
+    (3, 2, 1, 100.0, 3), (3, 3, 1, 90.0, 2), (3, 4, 2, 80.0, 5), (3, 5, 2, 110.0, 4),
+    (4, 1, 1, 0.0, 2), (4, 2, 1, 0.0, 1),
+]
+
+LEAGUE_INFO = {'status': 'in_season', 'settings': {'last_scored_leg': 3, 'playoff_week_start': 15}}
+ROSTER_IDS = [1, 2, 3, 4, 5]
+
+
+@pytest.fixture
+def lineups():
+    return pd.DataFrame({
+        'roster_id': [roster_id for _, roster_id, _, _, _ in LINEUPS],
+        'week': [week for week, _, _, _, _ in LINEUPS],
+        'matchup_id': [matchup_id for _, _, matchup_id, _, _ in LINEUPS],
+        'points': [points for _, _, _, points, _ in LINEUPS],
+        'optimal_points': [points + 10 for _, _, _, points, _ in LINEUPS],
+    })
+
+
+@pytest.mark.parametrize('week, roster_id, expected', [(week, roster_id, opponent)
+                                                       for week, roster_id, _, _, opponent in LINEUPS])
+def test_opponents(lineups, week, roster_id, expected):
+    opponents = main.build_opponent_index(lineups)
+
+    rows = opponents[(opponents['week'] == week) & (opponents['roster_id'] == roster_id)]
+    assert list(rows['opponent_roster_id']) == ([] if expected is NO_GAME else [expected])
+    if expected is not NO_GAME:
+        assert rows['opponent_points'].item() == lineups.loc[(lineups['week'] == week) &
+                                                             (lineups['roster_id'] == expected), 'points'].item()
+
+
+def test_team_weeks(lineups):
+    team_weeks = main.get_team_weeks(LEAGUE_INFO, lineups, main.build_opponent_index(lineups))
+
+    assert len(team_weeks) == 14
+    team_weeks = team_weeks.set_index(['roster_id', 'week'])
+    assert (1, 3) not in team_weeks.index
+    assert team_weeks.loc[(1, 1), 'points_against'] == 90
+    assert team_weeks.loc[(1, 1), 'optimal_points_against'] == 100
+    assert np.isnan(team_weeks.loc[(5, 1), 'points_against'])
+    assert team_weeks.loc[[(1, 2), (2, 2), (3, 2)], 'points_against'].isna().all()
+    assert team_weeks.loc[(5, 2), 'points_for'] == 85
+
+
+def test_all_play(lineups):
+    team_weeks = main.get_team_weeks(LEAGUE_INFO, lineups, main.build_opponent_index(lineups))
+
+    all_play, head_to_head = main.calculate_all_play(team_weeks, ROSTER_IDS)
+    all_play = all_play.set_index('roster_id')
+
+    # Every team that scored in a week meets every other one, with or without a head-to-head game
+    assert list(all_play['all_play_wins']) == [5, 8, 5, 5, 3]
+    assert list(all_play['all_play_losses']) == [3, 3, 6, 6, 8]
+    # Expected wins only count the weeks with a game, roster 1 played one in week 1 alone
+    assert all_play.loc[1, 'expected_wins'] == pytest.approx(0.75)
+    assert all_play.loc[1, 'luck'] == pytest.approx(0.25)
+    assert all_play.loc[4, 'expected_wins'] == pytest.approx(1.25)
+    assert all_play.loc[4, 'luck'] == pytest.approx(0.75)
+    assert all_play.loc[5, 'luck'] == pytest.approx(0)
+    assert head_to_head.loc[1, 2] == 1 and head_to_head.loc[2, 1] == 1
+    assert head_to_head.loc[5, 4] == 1 and head_to_head.loc[4, 5] == 2
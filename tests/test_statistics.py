@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+
+TEAM_WEEK_COLUMNS = ['roster_id', 'week', 'points_for', 'optimal_points_for', 'points_against',
+                     'optimal_points_against']
+
+
+def test_distributions_before_the_first_final_week():
+    # A league whose last_scored_leg is 0 has no completed weeks yet
+    team_weeks = pd.DataFrame(columns=TEAM_WEEK_COLUMNS).astype(
+        {'roster_id': 'int64', 'week': 'int64', 'points_for': 'float64', 'optimal_points_for': 'float64',
+         'points_against': 'float64', 'optimal_points_against': 'float64'})
+
+    distributions = main.calculate_team_distributions(team_weeks)
+
+    assert len(distributions) == 0
+    assert {'points_for_p25', 'points_for_p75', 'optimal_points_for_boom_rate'} <= set(distributions.columns)
+
+
+def test_analytics_before_the_first_final_week():
+    team_weeks = pd.DataFrame(columns=TEAM_WEEK_COLUMNS).astype({column: 'float64' for column in TEAM_WEEK_COLUMNS})
+    roster_data = pd.DataFrame({'roster_id': [1, 2], 'owner_id': ['10', '20'],
+                                'metadata': [{'record': ''}, {'record': ''}]})
+
+    statistics = main.calculate_analytics(roster_data, team_weeks)
+
+    assert list(statistics['roster_id']) == [1, 2]
+    assert list(statistics['points_for']) == [0, 0]
+    assert statistics['points_for_p25'].isna().all()
+
+
+def test_distributions_of_team_weeks():
+    team_weeks = pd.DataFrame({
+        'roster_id': [1, 1, 1, 1, 2, 2, 2, 2],
+        'week': [1, 2, 3, 4, 1, 2, 3, 4],
+        'points_for': [100.0, 110.0, 120.0, 130.0, 90.0, 90.0, 90.0, 90.0],
+        'optimal_points_for': [120.0, 120.0, 130.0, 140.0, 100.0, 100.0, 100.0, 100.0],
+        'points_against': [90.0, 90.0, np.nan, 90.0, 100.0, 110.0, 120.0, 130.0],
+        'optimal_points_against': [100.0, 100.0, np.nan, 100.0, 120.0, 120.0, 130.0, 140.0],
+    })
+
+    distributions = main.calculate_team_distributions(team_weeks)
+
+    assert distributions.loc[1, 'points_for'] == 460
+    assert distributions.loc[2, 'points_for_std'] == 0
+    assert distributions.loc[2, 'points_for_consistency'] == 1
+    assert distributions.loc[1, 'points_for_median'] == 115
+    # The bye of roster 1 in week 3 is no boom or bust week against it
+    assert distributions.loc[1, 'points_against_bust_rate'] == 0
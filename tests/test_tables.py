@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+
+SCHEMA = {'week': 'int64', 'player_id': 'category', 'points': 'float64'}
+
+
+@pytest.fixture
+def table_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'TABLE_DIR', str(tmp_path / 'tables'))
+    return tmp_path / 'tables'
+
+
+def make_table(version, rows=1000):
+    return pd.DataFrame({'week': np.full(rows, version), 'player_id': [str(version)] * rows,
+                         'points': np.full(rows, float(version))})
+
+
+def test_tables_round_trip(table_dir):
+    table = pd.DataFrame({'week': [1, 2], 'player_id': ['a', None], 'points': [1.5, 2.0]})
+    main.save_table('points', table, SCHEMA, {'status': 'complete'})
+
+    loaded = main.load_table('points')
+    assert list(loaded['week']) == [1, 2]
+    assert loaded['player_id'][0] == 'a' and pd.isna(loaded['player_id'][1])
+    assert main.is_table_final('points')
+    assert main.load_table('other') is None
+
+
+def test_loads_see_one_complete_version_while_the_table_is_saved(table_dir):
+    main.save_table('points', make_table(0), SCHEMA)
+    errors = []
+    done = threading.Event()
+
+    def save():
+        for version in range(1, 50):
+            main.save_table('points', make_table(version), SCHEMA)
+        done.set()
+
+    def load():
+        while not done.is_set():
+            try:
+                table = main.load_table('points')
+                assert len(set(table['week'])) == 1
+                assert set(table['points']) == set(table['week'].astype(float))
+                assert set(table['player_id'].astype(object)) == {str(table['week'][0])}
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=save)] + [threading.Thread(target=load) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert main.load_table('points')['week'][0] == 49
+
+
+def test_replaced_versions_are_removed_once_no_reader_can_be_left(table_dir):
+    def versions():
+        return sorted(entry for entry in os.listdir(table_dir) if entry.startswith('points.') and
+                      entry != 'points.current')
+
+    main.save_table('points_2', make_table(1), SCHEMA)
+    main.save_table('points', make_table(1), SCHEMA)
+    first = main.get_table_version('points')
+    for version in [2, 3]:
+        main.save_table('points', make_table(version), SCHEMA)
+    assert len(versions()) == 3
+
+    # Only versions that stopped being current more than TABLE_VERSION_TTL ago are removed
+    replaced_at = os.stat(table_dir / first).st_mtime - main.TABLE_VERSION_TTL - 1
+    os.utime(table_dir / first, (replaced_at, replaced_at))
+    main.save_table('points', make_table(4), SCHEMA)
+
+    assert len(versions()) == 3 and first not in versions()
+    assert main.load_table('points')['week'][0] == 4
+    assert main.load_table('points_2')['week'][0] == 1
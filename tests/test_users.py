@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+
+SEASONS = {'new': '2024', 'old': '2023'}
+
+
+def stub_api(monkeypatch, members):
+    # members maps a league id to its current {user_id: display_name}, /user/<id> knows every user of every league
+    requests = []
+
+    def sleeper_get(path, ttl=None):
+        requests.append(path)
+        league_id = path.split('/')[2]
+        return [{'user_id': user_id, 'display_name': name} for user_id, name in members[league_id].items()]
+
+    def sleeper_get_all(paths, ttls=None):
+        requests.extend(paths)
+        users = {user_id: name for league in members.values() for user_id, name in league.items()}
+        return [{'user_id': path.split('/')[2], 'display_name': users.get(path.split('/')[2])} for path in paths]
+
+    monkeypatch.setattr(main, 'sleeper_get', sleeper_get)
+    monkeypatch.setattr(main, 'sleeper_get_all', sleeper_get_all)
+    monkeypatch.setattr(main, 'get_league_info', lambda league_id: {'season': SEASONS[league_id]})
+    return requests
+
+
+def test_names_of_the_newest_season_win(monkeypatch):
+    stub_api(monkeypatch, {'new': {'1': 'current'}, 'old': {'1': 'former'}})
+
+    for order in (['new', 'old'], ['old', 'new']):
+        directory = main.UserDirectory()
+        for league_id in order:
+            directory.load_league(league_id, ['1'])
+        assert directory.get_names(['1']) == {'1': 'current'}
+
+
+def test_members_are_reloaded_once_their_response_expires(monkeypatch):
+    members = {'new': {'1': 'before'}}
+    requests = stub_api(monkeypatch, members)
+    now = [1000.0]
+    monkeypatch.setattr(main.time, 'time', lambda: now[0])
+    ttl = main.get_cache_ttl('/league/new/users')
+
+    directory = main.UserDirectory()
+    directory.load_league('new', ['1'])
+    members['new']['1'] = 'after'
+
+    now[0] += ttl / 2
+    directory.load_league('new', ['1'])
+    assert directory.get_names(['1']) == {'1': 'before'}
+
+    now[0] += ttl
+    directory.load_league('new', ['1'])
+    assert directory.get_names(['1']) == {'1': 'after'}
+    assert requests.count('/league/new/users') == 2
+
+
+def test_owners_who_left_are_looked_up(monkeypatch):
+    stub_api(monkeypatch, {'new': {'1': 'member'}, 'old': {'2': 'left'}})
+
+    directory = main.UserDirectory()
+    directory.load_league('new', ['1', '2'])
+
+    assert directory.get_names(['1', '2', '3']) == {'1': 'member', '2': 'left', '3': '3'}